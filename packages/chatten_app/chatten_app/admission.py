@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException
+from loguru import logger
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_exponential_jitter,
+)
+
+from chatten_app.metrics import (
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTIONS,
+    ADMISSION_WAIT,
+    UPSTREAM_RETRIES,
+)
+
+T = TypeVar("T")
+
+
+class Slot:
+    """Concurrency slot held by an admitted request.
+
+    The slot is released when the request leaves `AdmissionController.slot`, unless the work it started
+    is still running (e.g. a threadpool call abandoned on a timeout). Such work is registered with `hold_until`,
+    and the slot is only released once it finishes, so the concurrency cap holds for the upstream calls too.
+    """
+
+    def __init__(self):
+        self.pending: asyncio.Future | None = None
+
+    def hold_until(self, future: asyncio.Future) -> None:
+        self.pending = future
+
+
+class AdmissionController:
+    """Caps the amount of concurrent requests, with a bounded queue of the waiting ones.
+
+    Requests beyond the concurrency limit wait in the queue up to the queue timeout.
+    If the queue is full, or the wait times out, the request is rejected with 429 and a Retry-After header,
+    so the clients back off instead of piling up on the agent endpoint.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout_seconds: float,
+        retry_after_seconds: int,
+    ):
+        self._name = name
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._queue_timeout_seconds = queue_timeout_seconds
+        self._retry_after_seconds = retry_after_seconds
+        # both counters are updated without awaiting in between, so a burst of requests
+        # sees the admitted ones before any of them gets to wait on the semaphore
+        self._active = 0
+        self._waiting = 0
+
+        ADMISSION_QUEUE_DEPTH.labels(name).set_function(lambda: self._waiting)
+
+    def _reject(self, reason: str) -> HTTPException:
+        ADMISSION_REJECTIONS.labels(self._name, reason).inc()
+        return HTTPException(
+            status_code=429,
+            detail=f"Too many requests ({reason}), please retry later",
+            headers={"Retry-After": str(self._retry_after_seconds)},
+        )
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        if self._active + self._waiting >= self._max_concurrency + self._max_queue:
+            raise self._reject("queue_full")
+
+        self._waiting += 1
+        started_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                self._semaphore.acquire(), timeout=self._queue_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout") from None
+        finally:
+            self._waiting -= 1
+            ADMISSION_WAIT.labels(self._name).observe(time.perf_counter() - started_at)
+
+        self._active += 1
+        slot = Slot()
+        try:
+            yield slot
+        finally:
+            if slot.pending is not None and not slot.pending.done():
+                slot.pending.add_done_callback(lambda _: self._release())
+            else:
+                self._release()
+
+
+def upstream_status(exc: BaseException) -> int | None:
+    """HTTP status of the Databricks SDK error, for the statuses that are worth retrying."""
+    from databricks.sdk.errors import TemporarilyUnavailable, TooManyRequests
+
+    if isinstance(exc, TooManyRequests):
+        return 429
+    if isinstance(exc, TemporarilyUnavailable):
+        return 503
+    return None
+
+
+async def call_with_retries(
+    call: Callable[[], Awaitable[T]], max_attempts: int, deadline_seconds: float
+) -> T:
+    """Calls the upstream with jittered exponential backoff on 429 and 503.
+
+    Each attempt is retried by the Databricks SDK too, within its retry timeout
+    (see Config.upstream_retry_timeout_seconds), these retries come on top when the SDK gives up.
+    The whole call, including the retries, is bounded by the deadline: an attempt still running
+    when the deadline is reached is cancelled with asyncio.TimeoutError.
+    """
+    deadline = time.monotonic() + deadline_seconds
+
+    def log_retry(retry_state: RetryCallState):
+        status = upstream_status(retry_state.outcome.exception())
+        UPSTREAM_RETRIES.labels(str(status)).inc()
+        logger.warning(
+            f"Upstream responded with {status}, retrying... attempt {retry_state.attempt_number}/{max_attempts}"
+        )
+
+    retrying = AsyncRetrying(
+        retry=retry_if_exception(lambda exc: upstream_status(exc) is not None),
+        wait=wait_exponential_jitter(initial=0.5, max=10),
+        stop=stop_after_attempt(max_attempts) | stop_after_delay(deadline_seconds),
+        before_sleep=log_retry,
+        reraise=True,
+    )
+
+    async for attempt in retrying:
+        with attempt:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(call(), timeout=remaining)
@@ -1,25 +1,35 @@
+import asyncio
 import mimetypes
+from contextlib import contextmanager
 from pathlib import PosixPath
+from typing import Iterator
+from chatten_app.admission import Slot, call_with_retries, upstream_status
+from chatten_app.conversation import chat_message, estimate_tokens, prefix_digest
+from chatten_app.metrics import AGENT_LATENCY, IN_FLIGHT, registry
 from chatten_app.models import (
     ApiChatMetadata,
     ApiChatResponse,
     ChatRequest,
     ChatResponse,
     RelevantPageReq,
+    RelevantPageResp,
+    RelevantPagesReq,
 )
-from databricks.sdk.service.serving import ChatMessage, ChatMessageRole
-from fastapi import BackgroundTasks, FastAPI
+from fastapi import BackgroundTasks, FastAPI, HTTPException
 
 from chatten_app.state import AppState
-from fastapi.responses import JSONResponse, StreamingResponse
+from chatten_app.warmup import WarmupStatus
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from loguru import logger
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.concurrency import run_in_threadpool
 
 
 class StatefulApp(FastAPI):
     """FastAPI app with a state object that contains the client and file cache.
     Again, subclassing is used to add strong typing.
 
-    Note that initialization happens only once, when the app is starting.
+    Note that the state members are initialized lazily, on first use.
     """
 
     def __init__(self, *args, **kwargs):
@@ -30,52 +40,138 @@ class StatefulApp(FastAPI):
 api_app = StatefulApp()
 
 
+@contextmanager
+def file_not_found_as_404(file_name: PosixPath) -> Iterator[None]:
+    """Reports the files missing from the Volume as 404 instead of a server error."""
+    from databricks.sdk.errors import NotFound
+
+    try:
+        yield
+    except NotFound as e:
+        raise HTTPException(status_code=404, detail=f"File {file_name} not found") from e
+
+
 @api_app.post("/chat", response_model=ApiChatResponse)
 async def chat_with_llm(request: ChatRequest, background_tasks: BackgroundTasks):
+    with IN_FLIGHT.labels("chat").track_inprogress():
+        return await _chat_with_llm(request, background_tasks)
+
+
+async def _chat_with_llm(request: ChatRequest, background_tasks: BackgroundTasks):
+    config = api_app.state.config
+
+    session_id, history = api_app.state.conversations.history(
+        request.session_id,
+        token_budget=config.history_token_budget,
+        summary_token_budget=config.history_summary_token_budget,
+    )
+    messages = history + [chat_message("user", request.message)]
+    estimated_prompt_tokens = sum(estimate_tokens(message.content) for message in messages)
+    logger.info(
+        f"Session {session_id}: {len(history)} history messages, ~{estimated_prompt_tokens} prompt tokens (estimated)"
+    )
+
+    cache_key = api_app.state.responses_cache.key(prefix_digest(history), request.message)
 
-    if request in api_app.state.responses_cache:
+    prepared_response = api_app.state.responses_cache.get(cache_key)
+    if prepared_response is not None:
         logger.info(f"Request {request} found in cache, returning cached response")
-        return api_app.state.responses_cache.get(request)
 
     else:
 
         logger.info(
-            f"Received message: {request.message}, using endpoint: {api_app.state.config.agent_serving_endpoint_name}"
+            f"Received message: {request.message}, using endpoint: {config.agent_serving_endpoint_name}"
         )
 
-        result = api_app.state.client.serving_endpoints.query(
-            name=api_app.state.config.agent_serving_endpoint_name,
-            max_tokens=250,
-            messages=[
-                ChatMessage(
-                    content=request.message,
-                    role=ChatMessageRole.USER,
+        def invoke_agent() -> bytes:
+            # the invocations API is called directly, since serving_endpoints.query drops the custom outputs
+            try:
+                response = api_app.state.agent_client.api_client.do(
+                    "POST",
+                    f"/serving-endpoints/{config.agent_serving_endpoint_name}/invocations",
+                    body={
+                        "messages": [message.as_dict() for message in messages],
+                        "max_tokens": 250,
+                    },
+                    headers={"Accept": "application/json", "Content-Type": "application/json"},
+                    raw=True,
                 )
-            ],
-        )
+            except TimeoutError as e:
+                # the SDK gave up retrying 429 or 503 within its retry timeout, the upstream error is the cause
+                if e.__cause__ is not None and upstream_status(e.__cause__) is not None:
+                    raise e.__cause__
+                raise
+            return response["contents"].read()
+
+        async def query_agent(slot: Slot) -> bytes:
+            with AGENT_LATENCY.time():
+                call = asyncio.ensure_future(run_in_threadpool(invoke_agent))
+                try:
+                    return await asyncio.shield(call)
+                except asyncio.CancelledError:
+                    # the worker thread can't be interrupted on the deadline,
+                    # it keeps the admission slot until it's done
+                    slot.hold_until(call)
+                    raise
+
         try:
-            # all content is in the first choice, packed in a JSON serialized string
-            raw_content = result.choices[0].message.content
-            response = ChatResponse.from_content(raw_content)
+            async with api_app.state.chat_admission.slot() as slot:
+                result = await call_with_retries(
+                    lambda: query_agent(slot),
+                    max_attempts=config.upstream_max_attempts,
+                    deadline_seconds=config.chat_deadline_seconds,
+                )
+        except asyncio.TimeoutError:
+            return JSONResponse(
+                status_code=504,
+                content={"error": f"Agent did not respond within {config.chat_deadline_seconds}s"},
+            )
+        except Exception as e:
+            status = upstream_status(e)
+            if status is None:
+                raise
+            # upstream is still overloaded after the retries, let the client back off
+            return JSONResponse(
+                status_code=status,
+                content={"error": str(e)},
+                headers={"Retry-After": str(config.chat_retry_after_seconds)},
+            )
+
+        try:
+            response = ChatResponse.from_json(result)
 
         except Exception as e:
             return JSONResponse(status_code=500, content={"error": str(e)})
 
         unique_paths = set(source.path for source in response.sources)
         for path in unique_paths:
-            background_tasks.add_task(api_app.state.file_cache.download_file, path)
-
-        prepared_response = ApiChatResponse(
-            content=response.content,
-            metadata=[
-                ApiChatMetadata(content=source.query, file_name=source.path)
-                for source in response.sources
-            ],
-        )
+            api_app.state.warmer.record_source(path)
+
+        metadata = [
+            ApiChatMetadata(content=source.query, file_name=source.path)
+            for source in response.sources
+        ]
 
-        api_app.state.responses_cache.set(request, prepared_response)
+        if config.eager_relevant_pages:
+            # the answer is returned a bit later, but the UI gets the pages in the same round-trip
+            pages = await find_relevant_pages(
+                [RelevantPageReq(file_name=m.file_name, query=m.content) for m in metadata]
+            )
+            for meta, page in zip(metadata, pages):
+                meta.page_num = page.page_num
+        else:
+            for path in unique_paths:
+                background_tasks.add_task(api_app.state.file_cache.download_file, path)
 
-        return prepared_response
+        prepared_response = ApiChatResponse(content=response.content, metadata=metadata)
+
+        api_app.state.responses_cache.set(cache_key, prepared_response)
+
+    api_app.state.conversations.record(session_id, request.message, prepared_response.content)
+
+    return prepared_response.model_copy(
+        update={"session_id": session_id, "estimated_prompt_tokens": estimated_prompt_tokens}
+    )
 
 
 @api_app.get("/files")
@@ -85,8 +181,13 @@ def get_files(file_name: PosixPath):
     mime_type, _ = mimetypes.guess_type(file_name.as_posix())
     mime_type = mime_type or "application/octet-stream"  # Default if unknown
 
+    api_app.state.warmer.record_access(file_name)
+
+    with IN_FLIGHT.labels("files").track_inprogress(), file_not_found_as_404(file_name):
+        content = api_app.state.file_cache.get_as_iterable(file_name)
+
     return StreamingResponse(
-        api_app.state.file_cache.get_as_iterable(file_name),
+        content,
         media_type=mime_type,
         headers={
             "Content-Disposition": f'attachment; filename="{file_name.as_posix()}"'
@@ -94,13 +195,114 @@ def get_files(file_name: PosixPath):
     )
 
 
+@api_app.get("/files/slice")
+async def get_file_slice(file_name: PosixPath, page_num: int, window: int | None = None):
+    """Serve a standalone PDF with only the requested page and a small window of pages around it.
+
+    The position of the slice in the original file is reported in the X-Chatten-* headers.
+    """
+    config = api_app.state.config
+    window = min(config.slice_window if window is None else max(window, 0), config.max_slice_window)
+
+    api_app.state.warmer.record_access(file_name)
+
+    with IN_FLIGHT.labels("slice").track_inprogress():
+        with file_not_found_as_404(file_name):
+            content = await api_app.state.file_cache.get(file_name)
+        if not 1 <= page_num <= content.num_pages:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Page {page_num} not found in {file_name}, it has {content.num_pages} pages",
+            )
+        pdf_slice = await api_app.state.slice_cache.get(file_name, page_num, window)
+
+    return Response(
+        pdf_slice.content,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'inline; filename="{file_name.stem}-p{pdf_slice.first_page}-{pdf_slice.last_page}.pdf"',
+            "X-Chatten-First-Page": str(pdf_slice.first_page),
+            "X-Chatten-Last-Page": str(pdf_slice.last_page),
+            "X-Chatten-Num-Pages": str(pdf_slice.num_pages),
+        },
+    )
+
+
+async def find_relevant_pages(items: list[RelevantPageReq]) -> list[RelevantPageResp]:
+    """Find the most relevant pages for several (file, query) pairs at once.
+
+    Files are fetched concurrently (awaiting the downloads already in flight),
+    and the pages are scored concurrently in the threadpool. Duplicated pairs are scored only once.
+    Errors are reported per item, so one missing file doesn't fail the whole batch.
+    """
+    file_cache = api_app.state.file_cache
+    unique_files = list(dict.fromkeys(item.file_name for item in items))
+    fetched = await asyncio.gather(
+        *(file_cache.get(file_name) for file_name in unique_files),
+        return_exceptions=True,
+    )
+    contents = dict(zip(unique_files, fetched))
+
+    async def score(file_name: PosixPath, query: str) -> RelevantPageResp:
+        content = contents[file_name]
+        if isinstance(content, BaseException):
+            return RelevantPageResp(file_name=file_name, query=query, error=str(content))
+        page_num = await run_in_threadpool(content.find_best_match, query)
+        return RelevantPageResp(file_name=file_name, query=query, page_num=page_num)
+
+    unique_pairs = list(dict.fromkeys((item.file_name, item.query) for item in items))
+    scored = await asyncio.gather(*(score(*pair) for pair in unique_pairs))
+    results = dict(zip(unique_pairs, scored))
+    return [results[(item.file_name, item.query)] for item in items]
+
+
 @api_app.post("/files/relevant_page")
-def get_relevant_page(req: RelevantPageReq):
+async def get_relevant_page(req: RelevantPageReq):
     """Get the most relevant page for a given query in a file."""
-    with api_app.state.file_cache._lock:
-        assert (
-            req.file_name in api_app.state.file_cache._cache
-        ), f"File {req.file_name} not in cache"
-        content = api_app.state.file_cache._cache[req.file_name]
-    page_num = content.find_best_match(req.query)
+    with IN_FLIGHT.labels("relevant_page").track_inprogress():
+        with file_not_found_as_404(req.file_name):
+            content = await api_app.state.file_cache.get(req.file_name)
+        page_num = await run_in_threadpool(content.find_best_match, req.query)
     return JSONResponse(content={"page_num": page_num})
+
+
+@api_app.post("/files/relevant_pages", response_model=list[RelevantPageResp])
+async def get_relevant_pages(req: RelevantPagesReq):
+    """Get the most relevant pages for all the sources of an answer in a single round-trip."""
+    with IN_FLIGHT.labels("relevant_pages").track_inprogress():
+        return await find_relevant_pages(req.items)
+
+
+@api_app.get("/health/live")
+def get_liveness():
+    """Liveness probe, the app is alive as soon as it's serving requests."""
+    return JSONResponse(content={"status": "alive"})
+
+
+@api_app.get("/health/ready")
+def get_readiness():
+    """Readiness probe, the app is ready once the clients are created and the warmup is planned.
+    The warmup progress is reported as well, including whether all the planned files are preloaded.
+    """
+    startup = api_app.state.startup
+    if not startup.ready:
+        return JSONResponse(status_code=503, content={"startup": startup.model_dump()})
+
+    return JSONResponse(
+        content={
+            "startup": startup.model_dump(),
+            "warmup": api_app.state.warmer.status.model_dump(),
+        }
+    )
+
+
+@api_app.get("/warmup", response_model=WarmupStatus)
+def get_warmup_status():
+    """Report the progress of the startup cache warmup and the hit rate it achieves."""
+    return api_app.state.warmer.status
+
+
+@api_app.get("/metrics")
+def get_metrics():
+    """Expose the app metrics in Prometheus text format."""
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
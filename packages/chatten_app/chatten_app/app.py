@@ -1,55 +1,119 @@
 import asyncio
+import time
 from contextlib import asynccontextmanager
 from pathlib import PosixPath
+from threading import Lock
 from fastapi import FastAPI
-from chatten_app.dash_app import create_dash_app
-from fastapi.middleware.wsgi import WSGIMiddleware
 from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
 from chatten_app.api_app import api_app
-import concurrent.futures
+
+
+def create_ui_app() -> ASGIApp:
+    """Create the Dash UI app, wrapped for ASGI serving."""
+    # Dash and the UI components are heavy to import, so it's done only when the UI is needed
+    from chatten_app.dash_app import create_dash_app
+    from fastapi.middleware.wsgi import WSGIMiddleware
+
+    dash_app = create_dash_app()
+    dash_wsgi_app = WSGIMiddleware(dash_app.server)
+
+    if api_app.state.config.serve_static_natively:
+        from chatten_app.static import DashStaticFiles
+
+        # static assets are served directly by ASGI, only the dynamic Dash routes go through WSGI
+        return DashStaticFiles(dash_app, fallback=dash_wsgi_app)
+    return dash_wsgi_app
+
+
+class LazyApp:
+    """ASGI app created on first use (or when `build` is called in the background on startup)."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._app: ASGIApp | None = None
+        self._lock = Lock()
+
+    def build(self) -> ASGIApp:
+        with self._lock:
+            if self._app is None:
+                self._app = self._factory()
+            return self._app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        asgi_app = self._app or await run_in_threadpool(self.build)
+        await asgi_app(scope, receive, send)
+
+
+ui_app = LazyApp(create_ui_app)
+
+
+async def startup():
+    """Initialize the clients and the UI, then preload the most frequently accessed files
+    to avoid latency during the first requests.
+    Runs in the background, so the app starts serving (e.g. liveness probes) right away.
+    """
+    state = api_app.state
+    started_at = time.perf_counter()
+
+    try:
+        await asyncio.to_thread(ui_app.build)
+        await asyncio.to_thread(state.access_log.load)
+
+        entries = await asyncio.to_thread(
+            lambda: list(
+                state.client.files.list_directory_contents(
+                    state.config.full_raw_docs_path.as_posix()
+                )
+            )
+        )
+        sizes = {
+            PosixPath(file.name): file.file_size
+            for file in entries
+            if not file.is_directory
+        }
+        files_to_preload = state.warmer.plan(sizes, state.config.max_files_to_preload)
+        logger.info(f"Planned warmup of {len(files_to_preload)} files")
+    except Exception as exc:
+        state.startup.error = str(exc)
+        logger.exception(f"App initialization failed with: {exc}")
+        return
+
+    state.startup.startup_seconds = time.perf_counter() - started_at
+    state.startup.ready = True
+    logger.info(f"App is ready after {state.startup.startup_seconds:.2f}s")
+
+    await state.warmer.run(files_to_preload)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Preload the big files on app startup to avoid latency during the first request."""
-    logger.info("Starting the app and preloading files")
-    files = {
-        PosixPath(file.name): file.file_size
-        for file in api_app.state.client.files.list_directory_contents(
-            api_app.state.config.full_raw_docs_path.as_posix()
-        )
-        if not file.is_directory
-    }
-    top_files_by_size: list[PosixPath] = sorted(files, key=files.get, reverse=True)[
-        : api_app.state.config.max_files_to_preload
-    ]
+    logger.info("Starting the app")
+    state = api_app.state
 
-    async def download_files():
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-            futures = [
-                loop.run_in_executor(
-                    executor, api_app.state.file_cache.download_file, file
-                )
-                for file in top_files_by_size
-            ]
-            for future in asyncio.as_completed(futures):
-                try:
-                    await future
-                except Exception as exc:
-                    logger.warning(f"Startup-time file download failed with: {exc}")
+    async def flush_access_log():
+        while True:
+            await asyncio.sleep(state.config.access_log_flush_seconds)
+            if state.startup.ready:
+                await asyncio.to_thread(state.access_log.save)
 
-    asyncio.create_task(download_files())
+    background_tasks = [
+        asyncio.create_task(startup()),
+        asyncio.create_task(flush_access_log()),
+    ]
 
     yield
 
     logger.info("Stopping the app")
+    for task in background_tasks:
+        task.cancel()
+    if state.startup.ready:
+        await asyncio.to_thread(state.access_log.save)
 
 
 app = FastAPI(lifespan=lifespan)
 
-dash_app = create_dash_app()
-
 # note: the order of mounting is important!
 app.mount("/api", api_app)
-app.mount("/", WSGIMiddleware(dash_app.server))
+app.mount("/", ui_app)
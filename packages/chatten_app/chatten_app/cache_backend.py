@@ -0,0 +1,159 @@
+from __future__ import annotations
+import fcntl
+import hashlib
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+
+from chatten_app.metrics import CACHE_EVICTIONS
+
+
+class CacheBackend(ABC):
+    """Shared (L2) cache backend, used behind the per-worker in-memory caches.
+
+    Values are opaque bytes, serialization is up to the caches using the backend.
+    Entries are grouped into namespaces, each with its own byte budget.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> bytes | None:
+        """Returns the value or None if it's missing or expired."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: bytes, ttl_in_seconds: float) -> None:
+        """Stores the value, evicting the least recently used entries of the namespace if needed."""
+
+    @abstractmethod
+    @contextmanager
+    def lock(self, namespace: str, key: str) -> Iterator[None]:
+        """Exclusive lock for a key, shared by all the processes using the backend.
+        Used to make sure an expensive value (e.g. a downloaded file) is computed only once.
+        """
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Cache backend stored in a local SQLite database, shared by all the workers on the host.
+
+    SQLite in WAL mode allows concurrent readers with a single writer, which fits the read-heavy cache workload.
+    Key locks are implemented with flock on the lock files next to the database.
+    """
+
+    def __init__(self, cache_dir: Path, budgets: dict[str, int]):
+        self._cache_dir = cache_dir
+        self._locks_dir = cache_dir / "locks"
+        self._locks_dir.mkdir(parents=True, exist_ok=True)
+        self._db_path = cache_dir / "cache.db"
+        self._budgets = budgets
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, accessed_at)"
+            )
+
+        logger.info(f"Using shared SQLite cache backend at {self._db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so each thread gets its own one
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> bytes | None:
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, accessed_at FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, now),
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, accessed_at = row
+        # recency is only needed roughly, avoid a write on every read
+        if now - accessed_at > 60:
+            conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+        return value
+
+    def set(self, namespace: str, key: str, value: bytes, ttl_in_seconds: float) -> None:
+        budget = self._budgets.get(namespace)
+        if budget is not None and len(value) > budget:
+            logger.warning(
+                f"Value for {namespace}/{key} ({len(value)} bytes) exceeds the shared cache budget"
+            )
+            return
+
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND expires_at <= ?",
+                (namespace, now),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, len(value), now + ttl_in_seconds, now),
+            )
+            if budget is not None:
+                self._evict(conn, namespace, budget)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, namespace: str, budget: int) -> None:
+        (total,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        if total <= budget:
+            return
+
+        evicted = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed_at",
+            (namespace,),
+        ).fetchall():
+            if total <= budget:
+                break
+            evicted.append((namespace, key))
+            total -= size
+
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", evicted)
+        CACHE_EVICTIONS.labels(f"{namespace}_shared").inc(len(evicted))
+
+    @contextmanager
+    def lock(self, namespace: str, key: str) -> Iterator[None]:
+        digest = hashlib.sha1(f"{namespace}:{key}".encode()).hexdigest()
+        with (self._locks_dir / f"{digest}.lock").open("w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+import hashlib
+import uuid
+from contextlib import contextmanager
+from threading import Lock
+from typing import TYPE_CHECKING, Iterator, Literal
+
+from cachetools import TTLCache
+from loguru import logger
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from databricks.sdk.service.serving import ChatMessage
+
+    from chatten_app.cache_backend import CacheBackend
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting the history."""
+    return max(1, len(text) // 4)
+
+
+def _summarize_turn(turn: Turn, max_chars: int = 200) -> str:
+    """Extractive one-line summary of a turn: its first sentence, capped in length."""
+    first_sentence = turn.content.strip().split("\n")[0].split(". ")[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars].rstrip() + "..."
+    speaker = "User" if turn.role == "user" else "Assistant"
+    return f"{speaker}: {first_sentence}"
+
+
+def chat_message(role: str, content: str) -> ChatMessage:
+    # the SDK is imported lazily, since importing any of its modules loads the whole package
+    from databricks.sdk.service.serving import ChatMessage, ChatMessageRole
+
+    return ChatMessage(role=ChatMessageRole(role), content=content)
+
+
+class Turn(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.content)
+
+    def as_message(self) -> ChatMessage:
+        return chat_message(self.role, self.content)
+
+
+class Conversation(BaseModel):
+    """Server-side conversation history.
+
+    Turns that no longer fit into the token budget are folded into a running summary.
+    The summary is built incrementally - each turn is summarized only once, when it falls out of the window,
+    and the result is reused by all the subsequent requests in the session.
+    """
+
+    session_id: str
+    turns: list[Turn] = []
+    summary_lines: list[str] = []
+    summarized_upto: int = 0  # index of the first turn not yet folded into the summary
+
+    @property
+    def summary(self) -> str | None:
+        if not self.summary_lines:
+            return None
+        return "Summary of the earlier conversation:\n" + "\n".join(self.summary_lines)
+
+    def add_turn(self, role: Literal["user", "assistant"], content: str) -> None:
+        self.turns.append(Turn(role=role, content=content))
+
+    def compact(self, token_budget: int, summary_token_budget: int) -> list[ChatMessage]:
+        """Returns the history to be sent with the next message, fitting into the token budget."""
+        window_budget = token_budget - summary_token_budget
+
+        # walk backwards and keep as many recent turns verbatim as the budget allows
+        window_start, used = len(self.turns), 0
+        while window_start > self.summarized_upto:
+            turn_tokens = self.turns[window_start - 1].tokens
+            if used + turn_tokens > window_budget:
+                break
+            used += turn_tokens
+            window_start -= 1
+
+        # fold the turns that fell out of the window into the summary
+        for turn in self.turns[self.summarized_upto : window_start]:
+            self.summary_lines.append(_summarize_turn(turn))
+        self.summarized_upto = window_start
+
+        # keep the summary within its own budget, dropping the oldest lines first
+        while self.summary_lines and estimate_tokens(self.summary) > summary_token_budget:
+            self.summary_lines.pop(0)
+
+        history = [turn.as_message() for turn in self.turns[window_start:]]
+        if self.summary:
+            history.insert(0, chat_message("system", self.summary))
+        return history
+
+
+def prefix_digest(history: list[ChatMessage]) -> str:
+    """Stable digest of the conversation prefix, used as a part of the responses cache key."""
+    digest = hashlib.sha256()
+    for message in history:
+        digest.update(message.role.value.encode())
+        digest.update(b"\x00")
+        digest.update(message.content.encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ConversationStore:
+    """Thread-safe store of conversations keyed by session ID, with TTL-based eviction of idle sessions.
+
+    With a shared backend, the conversations are kept in the backend instead of the worker memory,
+    so the turns of a session can be served by any of the app workers. The updates of a session are
+    serialized with the backend key lock, since two workers may handle the same session at once.
+    """
+
+    namespace = "conversations"
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_in_seconds: int = 3600,
+        backend: CacheBackend | None = None,
+    ):
+        self._conversations: TTLCache[str, Conversation] = TTLCache(
+            maxsize=max_sessions, ttl=ttl_in_seconds
+        )
+        self._ttl_in_seconds = ttl_in_seconds
+        self._backend = backend
+        self._lock = Lock()
+
+    @contextmanager
+    def _session_lock(self, session_id: str) -> Iterator[None]:
+        with self._lock if self._backend is None else self._backend.lock(self.namespace, session_id):
+            yield
+
+    def _load(self, session_id: str) -> Conversation | None:
+        if self._backend is None:
+            return self._conversations.get(session_id)
+        value = self._backend.get(self.namespace, session_id)
+        return Conversation.model_validate_json(value) if value is not None else None
+
+    def _store(self, conversation: Conversation) -> None:
+        # storing again refreshes the TTL of the session
+        if self._backend is None:
+            self._conversations[conversation.session_id] = conversation
+        else:
+            self._backend.set(
+                self.namespace,
+                conversation.session_id,
+                conversation.model_dump_json().encode(),
+                self._ttl_in_seconds,
+            )
+
+    def history(
+        self, session_id: str | None, token_budget: int, summary_token_budget: int
+    ) -> tuple[str, list[ChatMessage]]:
+        """Returns the (possibly new) session ID and the compacted history of the session.
+
+        Only the session IDs issued by the store are accepted: an unknown (or expired) ID
+        starts a new session with a fresh ID, instead of creating a session with the ID picked by the client.
+        """
+        # the shared backend is looked up before taking the key lock, so unknown IDs don't create lock files
+        if session_id and (self._backend is None or self._load(session_id) is not None):
+            with self._session_lock(session_id):
+                conversation = self._load(session_id)
+                if conversation is not None:
+                    history = conversation.compact(token_budget, summary_token_budget)
+                    # the summary is built incrementally, so the compacted state is kept for the next turns
+                    self._store(conversation)
+                    return session_id, history
+
+        if session_id:
+            logger.info(f"Unknown session {session_id}, starting a new session")
+
+        conversation = Conversation(session_id=uuid.uuid4().hex)
+        with self._session_lock(conversation.session_id):
+            self._store(conversation)
+        return conversation.session_id, []
+
+    def record(self, session_id: str, message: str, answer: str) -> None:
+        """Appends the question and the answer to the session history."""
+        with self._session_lock(session_id):
+            # None if the session expired while the answer was being prepared
+            conversation = self._load(session_id) or Conversation(session_id=session_id)
+            conversation.add_turn("user", message)
+            conversation.add_turn("assistant", answer)
+            self._store(conversation)
@@ -4,8 +4,9 @@ import dash
 
 def create_dash_app() -> dash.Dash:
     """Create a Dash app with the Chatten UI.
-    Note that chatten is heavily styled with Tailwind CSS, so you need to include the CDN link.
+    Note that chatten is heavily styled with Tailwind CSS. The stylesheet is compiled at build time
+    and shipped with the chatten_ui package, Dash serves it with the fingerprinted, long-cached component assets.
     """
-    app = dash.Dash(__name__, title="Chatten UI", external_scripts=["https://cdn.tailwindcss.com"])
+    app = dash.Dash(__name__, title="Chatten UI")
     app.layout = ChattenUi(id="chatten")
     return app
@@ -0,0 +1,287 @@
+"""Local stand-ins for the Databricks APIs used by the app, for offline load testing.
+
+`FakeWorkspaceClient` mimics the parts of the WorkspaceClient the app relies on: the agent endpoint
+invocations (via `api_client.do`), `files.download`, `files.upload` and `files.list_directory_contents`.
+Like the SDK, `api_client.do` retries the rate-limited calls itself until its retry timeout.
+The Volume contains synthetic PDF files with generated text, and the agent answers with sources
+that point to the real pages of these files, so the whole serving path (file cache, relevant pages, slices)
+is exercised. Latencies, failure rate and payload sizes come from the config.
+
+Enable it with CHATTEN_WORKSPACE_BACKEND=fake.
+"""
+
+from __future__ import annotations
+import functools
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from io import BytesIO
+from pathlib import PosixPath
+from threading import Lock
+from typing import BinaryIO, Callable, Iterator
+
+from loguru import logger
+
+from chatten.config import Config
+
+VOCABULARY = (
+    "cluster warehouse notebook pipeline table volume catalog schema query index vector "
+    "endpoint model serving token workspace job task stream checkpoint partition delta "
+    "merge optimize vacuum photon autoscaling driver worker executor memory disk cache "
+    "permission grant lineage audit secret scope library runtime version upgrade metric"
+).split()
+
+LINE_LENGTH = 90
+
+
+def page_text(file_index: int, page_index: int, words_per_page: int) -> str:
+    """Deterministic text of a page, so the same corpus is generated on every run."""
+    rng = random.Random(f"{file_index}-{page_index}")
+    return " ".join(rng.choices(VOCABULARY, k=words_per_page))
+
+
+def _text_lines(text: str) -> list[str]:
+    lines, current = [], ""
+    for word in text.split():
+        if current and len(current) + len(word) + 1 > LINE_LENGTH:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    if current:
+        lines.append(current)
+    return lines
+
+
+def synthetic_pdf(pages: list[str], padding_bytes: int = 0) -> bytes:
+    """Minimal valid PDF with one text page per item of `pages`.
+
+    The padding is stored as an unreferenced stream object: it makes the file bigger
+    without changing its pages or the extracted text.
+    """
+    objects: dict[int, bytes] = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+
+    kids = []
+    for i, text in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        escaped = [
+            line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            for line in _text_lines(text)
+        ]
+        stream = (
+            "BT /F1 10 Tf 12 TL 40 760 Td "
+            + " ".join(f"({line}) Tj T*" for line in escaped)
+            + " ET"
+        ).encode()
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> "
+            + f"/Contents {content_id} 0 R >>".encode()
+        )
+        objects[content_id] = (
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    if padding_bytes > 0:
+        padding = random.Random(len(pages)).randbytes(padding_bytes)
+        objects[max(objects) + 1] = (
+            f"<< /Length {len(padding)} >>\nstream\n".encode() + padding + b"\nendstream"
+        )
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = out.tell()
+        out.write(f"{obj_id} 0 obj\n".encode() + objects[obj_id] + b"\nendobj\n")
+
+    xref_offset = out.tell()
+    size = max(objects) + 1
+    out.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+    for obj_id in range(1, size):
+        out.write(f"{offsets[obj_id]:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    )
+    return out.getvalue()
+
+
+def _jittered(latency: float) -> float:
+    return latency * random.uniform(0.5, 1.5)
+
+
+@dataclass
+class DirectoryEntry:
+    path: str
+    name: str
+    file_size: int
+    is_directory: bool = False
+
+
+@dataclass
+class DownloadResponse:
+    contents: BinaryIO
+
+
+class FakeFiles:
+    """Files API over the synthetic corpus. Uploaded files (e.g. the access log) are kept in memory."""
+
+    def __init__(self, config: Config):
+        self._config = config
+        self._uploads: dict[str, bytes] = {}
+        self._lock = Lock()
+
+    @property
+    def file_names(self) -> list[str]:
+        return [f"manual_{i:03d}.pdf" for i in range(self._config.fake_num_files)]
+
+    @functools.lru_cache(maxsize=None)
+    def _generate(self, file_index: int) -> bytes:
+        pages = [
+            page_text(file_index, page_index, self._config.fake_words_per_page)
+            for page_index in range(self._config.fake_pages_per_file)
+        ]
+        return synthetic_pdf(pages, self._config.fake_file_padding_bytes)
+
+    def _content(self, file_path: str) -> bytes:
+        from databricks.sdk.errors import NotFound
+
+        with self._lock:
+            if file_path in self._uploads:
+                return self._uploads[file_path]
+
+        path = PosixPath(file_path)
+        if path.parent == self._config.full_raw_docs_path and path.name in self.file_names:
+            return self._generate(self.file_names.index(path.name))
+        raise NotFound(f"File {file_path} does not exist")
+
+    def download(self, file_path: str) -> DownloadResponse:
+        time.sleep(_jittered(self._config.fake_download_latency_seconds))
+        return DownloadResponse(contents=BytesIO(self._content(file_path)))
+
+    def upload(self, file_path: str, contents: BinaryIO, *, overwrite: bool = False) -> None:
+        with self._lock:
+            self._uploads[file_path] = contents.read()
+
+    def list_directory_contents(self, directory_path: str) -> Iterator[DirectoryEntry]:
+        for name in self.file_names:
+            yield DirectoryEntry(
+                path=f"{directory_path}/{name}",
+                name=name,
+                file_size=len(self._content(f"{directory_path}/{name}")),
+            )
+
+
+class FakeServingEndpoints:
+    """Agent endpoint answering with sources picked from the synthetic corpus.
+
+    The answer has the same shape as the real agent output: the answer in the content,
+    with the retriever results in the custom outputs.
+    """
+
+    def __init__(self, config: Config, files: FakeFiles):
+        self._config = config
+        self._files = files
+
+    def _sources(self, question: str) -> list[dict]:
+        # the same question always gets the same sources, like a real retriever would do
+        rng = random.Random(hashlib.sha256(question.encode()).digest())
+        sources = []
+        for _ in range(self._config.fake_sources_per_answer):
+            file_index = rng.randrange(self._config.fake_num_files)
+            text = page_text(
+                file_index,
+                rng.randrange(self._config.fake_pages_per_file),
+                self._config.fake_words_per_page,
+            ).split()
+            start = rng.randrange(max(len(text) - 30, 1))
+            path = self._config.full_raw_docs_path / self._files.file_names[file_index]
+            sources.append(
+                {"query": " ".join(text[start : start + 30]), "path": path.as_posix()}
+            )
+        return sources
+
+    def invoke(self, name: str, body: dict) -> dict:
+        from databricks.sdk.errors import TooManyRequests
+
+        time.sleep(_jittered(self._config.fake_query_latency_seconds))
+        if random.random() < self._config.fake_error_rate:
+            # the SDK sets the delay from the Retry-After header, 1 second if there is none
+            raise TooManyRequests(f"Endpoint {name} is rate limited (fake)", retry_after_secs=1)
+
+        question = body["messages"][-1]["content"]
+        return {
+            "object": "chat.completion",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": f"Here is what the docs say about: {question}",
+                    },
+                    "finish_reason": "stop",
+                }
+            ],
+            "custom_outputs": {"sources": self._sources(question)},
+        }
+
+
+class FakeApiClient:
+    """Raw API client, only the agent endpoint invocations are supported.
+
+    The throttled calls are retried like the SDK does: sleeping for the Retry-After of the error,
+    until the retry timeout is reached, and then a TimeoutError is raised from the last error.
+    """
+
+    def __init__(self, serving_endpoints: FakeServingEndpoints, retry_timeout_seconds: int | None = None):
+        self._serving_endpoints = serving_endpoints
+        self._retry_timeout_seconds = retry_timeout_seconds or 300
+
+    def _retried(self, call: Callable[[], dict]) -> dict:
+        deadline = time.monotonic() + self._retry_timeout_seconds
+        last_error = None
+        while time.monotonic() < deadline:
+            try:
+                return call()
+            except Exception as e:
+                if getattr(e, "retry_after_secs", None) is None:
+                    raise
+                last_error = e
+                time.sleep(e.retry_after_secs + random.random())
+        raise TimeoutError(f"Timed out after {timedelta(seconds=self._retry_timeout_seconds)}") from last_error
+
+    def do(self, method: str, path: str, *, body: dict | None = None, raw: bool = False, **kwargs):
+        from databricks.sdk.errors import NotFound
+
+        prefix, _, endpoint = path.rpartition("/serving-endpoints/")
+        if method != "POST" or prefix or not endpoint.endswith("/invocations"):
+            raise NotFound(f"{method} {path} is not supported by the fake backend")
+
+        response = self._retried(
+            lambda: self._serving_endpoints.invoke(endpoint.removesuffix("/invocations"), body)
+        )
+        if raw:
+            return {"contents": BytesIO(json.dumps(response).encode())}
+        return response
+
+
+class FakeWorkspaceClient:
+    """Drop-in replacement of the WorkspaceClient for the APIs used by the app."""
+
+    def __init__(self, config: Config, retry_timeout_seconds: int | None = None):
+        self.files = FakeFiles(config)
+        self.serving_endpoints = FakeServingEndpoints(config, self.files)
+        self.api_client = FakeApiClient(self.serving_endpoints, retry_timeout_seconds)
+        logger.warning(
+            f"Using fake workspace backend with {config.fake_num_files} synthetic files, "
+            "no Databricks APIs will be called"
+        )
@@ -0,0 +1,132 @@
+"""Prometheus metrics of the app, exposed via the /api/metrics endpoint.
+
+Updating a metric is a cheap in-memory operation, so the instrumentation can stay on under load.
+Size-related gauges are computed on scrape via callbacks instead of on every cache operation.
+"""
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    ProcessCollector,
+)
+
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+
+# buckets are tuned for the typical latencies of the measured operations
+_AGENT_BUCKETS = (0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 60)
+_IO_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+_CPU_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+AGENT_LATENCY = Histogram(
+    "chatten_agent_request_seconds",
+    "Latency of the agent serving endpoint calls",
+    buckets=_AGENT_BUCKETS,
+    registry=registry,
+)
+
+FILE_DOWNLOAD_LATENCY = Histogram(
+    "chatten_file_download_seconds",
+    "Time spent downloading files from the Volume",
+    buckets=_IO_BUCKETS,
+    registry=registry,
+)
+
+FILE_EXTRACTION_LATENCY = Histogram(
+    "chatten_file_extraction_seconds",
+    "Time spent extracting the text from downloaded PDF files",
+    buckets=_IO_BUCKETS,
+    registry=registry,
+)
+
+BEST_MATCH_LATENCY = Histogram(
+    "chatten_best_match_seconds",
+    "Time spent searching for the most relevant page in a file",
+    buckets=_CPU_BUCKETS,
+    registry=registry,
+)
+
+CACHE_HITS = Counter(
+    "chatten_cache_hits", "Cache hits", ["cache"], registry=registry
+)
+CACHE_MISSES = Counter(
+    "chatten_cache_misses", "Cache misses", ["cache"], registry=registry
+)
+CACHE_EVICTIONS = Counter(
+    "chatten_cache_evictions",
+    "Entries evicted from the cache, either by size or by TTL",
+    ["cache"],
+    registry=registry,
+)
+CACHE_BYTES = Gauge(
+    "chatten_cache_bytes",
+    "Approximate size of the cached values in bytes",
+    ["cache"],
+    registry=registry,
+)
+CACHE_MAX_BYTES = Gauge(
+    "chatten_cache_max_bytes",
+    "Byte budget of the cache",
+    ["cache"],
+    registry=registry,
+)
+CACHE_ENTRIES = Gauge(
+    "chatten_cache_entries", "Number of entries in the cache", ["cache"], registry=registry
+)
+
+IN_FLIGHT = Gauge(
+    "chatten_requests_in_flight",
+    "Requests currently being processed",
+    ["endpoint"],
+    registry=registry,
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "chatten_admission_queue_depth",
+    "Requests waiting for a free concurrency slot",
+    ["endpoint"],
+    registry=registry,
+)
+ADMISSION_WAIT = Histogram(
+    "chatten_admission_wait_seconds",
+    "Time spent waiting for a free concurrency slot",
+    ["endpoint"],
+    buckets=_CPU_BUCKETS + (2.5, 5, 10, 30),
+    registry=registry,
+)
+ADMISSION_REJECTIONS = Counter(
+    "chatten_admission_rejections",
+    "Requests rejected with 429 because the queue was full or the wait timed out",
+    ["endpoint", "reason"],
+    registry=registry,
+)
+UPSTREAM_RETRIES = Counter(
+    "chatten_upstream_retries",
+    "Retries of the agent endpoint calls, by the upstream status code",
+    ["status"],
+    registry=registry,
+)
+
+WARMUP_FILES = Gauge(
+    "chatten_warmup_files",
+    "Files planned, preloaded or failed during the cache warmup",
+    ["status"],
+    registry=registry,
+)
+WARMUP_BYTES = Gauge(
+    "chatten_warmup_planned_bytes",
+    "Total size of the files planned for the cache warmup",
+    registry=registry,
+)
+WARMUP_HIT_RATE = Gauge(
+    "chatten_warmup_hit_rate",
+    "Share of the file accesses served by the files preloaded during the warmup",
+    registry=registry,
+)
+
+
+def requests_in_flight() -> float:
+    """Total number of requests currently being processed, across all endpoints."""
+    return sum(sample.value for sample in IN_FLIGHT.collect()[0].samples)
@@ -5,29 +5,26 @@ from pydantic_core import from_json
 from typing import Literal, Annotated, Any
 
 
-
 class ChatRequest(BaseModel):
     message: str
-
-    def __hash__(self):
-        return hash(self.message)
-
-    def __eq__(self, other):
-        if isinstance(other, ChatRequest):
-            return self.message == other.message
-        return False
+    # ID of a session issued by the server, a new session is started if it's not provided or unknown
+    session_id: str | None = None
 
 
 class ApiChatMetadata(BaseModel):
     content: str
     file_name: PosixPath
     year: int | None = None
+    page_num: int | None = None  # only provided if relevant pages are computed eagerly
 
 
 class ApiChatResponse(BaseModel):
     content: str
     metadata: list[ApiChatMetadata]
     error_happened: bool = False
+    session_id: str | None = None
+    # estimate (~4 characters per token) of the tokens sent to the agent, including the history
+    estimated_prompt_tokens: int | None = None
 
 
 class RelevantPageReq(BaseModel):
@@ -35,14 +32,15 @@ class RelevantPageReq(BaseModel):
     query: str
 
 
-class HumanMessage(BaseModel):
-    message_type: Literal["human"] = Field(alias="type")
-    content: str
+class RelevantPagesReq(BaseModel):
+    items: list[RelevantPageReq]
 
 
-class AiMessage(BaseModel):
-    message_type: Literal["ai"] = Field(alias="type")
-    content: str
+class RelevantPageResp(BaseModel):
+    file_name: PosixPath
+    query: str
+    page_num: int | None = None
+    error: str | None = None
 
 
 class SourceInfo(BaseModel):
@@ -51,9 +49,56 @@ class SourceInfo(BaseModel):
 
     @field_validator("path", mode="before")
     @classmethod
-    def val_path(cls, value: Any) -> PosixPath:
+    def val_path(cls, value: Any) -> str:
         assert isinstance(value, str), "path must be a string"
-        return PosixPath(value.split("/")[-1])  # only the file name is needed
+        return value.split("/")[-1]  # only the file name is needed
+
+
+class AgentMessage(BaseModel):
+    content: str | None = None
+
+
+class AgentChoice(BaseModel):
+    message: AgentMessage
+
+
+class AgentCustomOutputs(BaseModel):
+    sources: list[SourceInfo] = []
+
+
+class AgentResponse(BaseModel):
+    """Chat completion returned by the agent endpoint, with the sources in the custom outputs."""
+
+    choices: list[AgentChoice]
+    custom_outputs: AgentCustomOutputs | None = None
+
+
+class ChatResponse(BaseModel):
+    content: str
+    sources: list[SourceInfo]
+
+    @classmethod
+    def from_json(cls, raw: bytes | str) -> ChatResponse:
+        """Parses the raw agent endpoint response in a single pass.
+
+        Agents logged before the sources were moved to the custom outputs
+        pack all their messages as a JSON string in the content, these are still supported.
+        """
+        response = AgentResponse.model_validate_json(raw)
+        content = response.choices[0].message.content or ""
+        if response.custom_outputs is None:
+            return LegacyChatResponse.from_content(content).as_chat_response()
+        return cls(content=content, sources=response.custom_outputs.sources)
+
+
+class HumanMessage(BaseModel):
+    message_type: Literal["human"] = Field(alias="type")
+    content: str
+
+
+class AiMessage(BaseModel):
+    message_type: Literal["ai"] = Field(alias="type")
+    content: str
 
 
 class ToolMessage(BaseModel):
@@ -76,23 +121,20 @@ Message = Annotated[
 ]
 
 
-class ChatResponse(BaseModel):
+class LegacyChatResponse(BaseModel):
+    """All the agent messages serialized as a JSON string in the content, as returned by the older agents."""
+
     messages: list[Message]
 
     @classmethod
-    def from_content(cls, raw_content: str) -> ChatResponse:
+    def from_content(cls, raw_content: str) -> LegacyChatResponse:
         return cls(messages=from_json(raw_content))
 
-    @property
-    def content(self) -> str:
+    def as_chat_response(self) -> ChatResponse:
         ai_message = next(
             message for message in self.messages if message.message_type == "ai" and message.content
         )
-        return ai_message.content
-
-    @property
-    def sources(self) -> list[SourceInfo]:
         tool_message = next(
             message for message in self.messages if message.message_type == "tool"
         )
-        return tool_message.metadata
+        return ChatResponse(content=ai_message.content, sources=tool_message.metadata)
@@ -1,23 +1,78 @@
+from __future__ import annotations
+import asyncio
 from cachetools import TTLCache
-from chatten_app.models import ApiChatResponse, ChatRequest
-from databricks.sdk import WorkspaceClient
-from databricks.sdk.service.files import DownloadResponse
-from pypdf import PdfReader
+from chatten_app.admission import AdmissionController
+from chatten_app.cache_backend import CacheBackend, SQLiteCacheBackend
+from chatten_app.conversation import ConversationStore
+from chatten_app.metrics import (
+    BEST_MATCH_LATENCY,
+    CACHE_BYTES,
+    CACHE_ENTRIES,
+    CACHE_EVICTIONS,
+    CACHE_HITS,
+    CACHE_MAX_BYTES,
+    CACHE_MISSES,
+    FILE_DOWNLOAD_LATENCY,
+    FILE_EXTRACTION_LATENCY,
+    requests_in_flight,
+)
+from chatten_app.models import ApiChatResponse
+from chatten_app.warmup import AccessLog, Warmer
 from pathlib import PosixPath
-from threading import Lock
-from typing import Generator
-import rapidfuzz
+from concurrent.futures import Future
+from threading import Lock, RLock
+from typing import TYPE_CHECKING, Generator
 from loguru import logger
 from pydantic import BaseModel
-import time
 import functools
+import json
+import struct
 
 from io import BytesIO
 
+from starlette.concurrency import run_in_threadpool
 from starlette.datastructures import State
 
 from chatten.config import Config
 
+# heavy modules (Databricks SDK, pypdf, rapidfuzz) are imported where they're used,
+# to keep the app import and startup fast
+if TYPE_CHECKING:
+    from databricks.sdk import WorkspaceClient
+
+
+class lazy_property(functools.cached_property):
+    """cached_property that is safe to access concurrently: the value is created exactly once.
+    A single re-entrant lock is shared by all the lazy properties, since they depend on each other.
+    """
+
+    _lock = RLock()
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        with self._lock:
+            return super().__get__(instance, owner)
+
+
+class InstrumentedTTLCache(TTLCache):
+    """TTLCache that counts evictions (both size- and TTL-based) into the cache metrics."""
+
+    def __init__(self, name: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+
+    def popitem(self):
+        item = super().popitem()
+        CACHE_EVICTIONS.labels(self.name).inc()
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if expired:
+            CACHE_EVICTIONS.labels(self.name).inc(len(expired))
+        return expired
+
 
 class FileContent(BaseModel):
     """Model to store file content in cache.
@@ -29,124 +84,465 @@ class FileContent(BaseModel):
     raw: bytes
     extracted_pages: list[str]
 
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint: raw bytes plus the extracted text."""
+        return len(self.raw) + sum(len(page) for page in self.extracted_pages)
+
+    def to_bytes(self) -> bytes:
+        """Compact binary form for the shared cache: header length, JSON-encoded pages, raw bytes."""
+        pages = json.dumps(self.extracted_pages).encode()
+        return struct.pack(">Q", len(pages)) + pages + self.raw
+
+    @classmethod
+    def from_bytes(cls, value: bytes) -> "FileContent":
+        (pages_length,) = struct.unpack_from(">Q", value)
+        pages_end = 8 + pages_length
+        return cls(
+            raw=value[pages_end:], extracted_pages=json.loads(value[8:pages_end])
+        )
+
     @property
     def as_io(self) -> BytesIO:
         """Returns the raw bytes as a BytesIO object. Useful for streaming."""
         return BytesIO(self.raw)
 
+    @property
+    def num_pages(self) -> int:
+        return len(self.extracted_pages)
+
+    def page_range(self, page_num: int, window: int) -> tuple[int, int]:
+        """First and last page numbers (1-based, inclusive) of the window around the page."""
+        last_page = max(self.num_pages, 1)
+        page_num = min(max(page_num, 1), last_page)
+        return max(page_num - window, 1), min(page_num + window, last_page)
+
+    def slice(self, first_page: int, last_page: int) -> bytes:
+        """Builds a standalone PDF with the given pages (1-based, inclusive)."""
+        from pypdf import PdfReader, PdfWriter
+
+        reader = PdfReader(self.as_io)
+        writer = PdfWriter()
+        for page in reader.pages[first_page - 1 : last_page]:
+            writer.add_page(page)
+
+        output = BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    @BEST_MATCH_LATENCY.time()
     def find_best_match(self, query: str) -> int:
+        import rapidfuzz
+
         # strip query to first 100 characters
         _query = query[:100].strip()
-        best_page = max(
-            self.extracted_pages,
-            key=lambda page: rapidfuzz.fuzz.partial_ratio(page, _query),
-            default="",
+        index = max(
+            range(len(self.extracted_pages)),
+            key=lambda i: rapidfuzz.fuzz.partial_ratio(self.extracted_pages[i], _query),
+            default=0,
         )
-        index = self.extracted_pages.index(best_page)
 
         if index <= 0:
             logger.warning(f"No relevant pages found for query: {_query}")
             return 1  # page number starts from 1, return 1 if no relevant page found
 
-        logger.info(f"Found relevant page for query: {_query} at index: {index}")
+        logger.debug(f"Found relevant page for query: {_query} at index: {index}")
         return index + 1  # page number starts from 1
 
 
 class FileCache:
     """Cache for storing file contents.
 
-    The cache is a TTLCache with a maximum size and a time-to-live (TTL) for each entry.
+    The cache is a TTLCache with a byte budget and a time-to-live (TTL) for each entry.
+    Each entry is weighted by its memory footprint (raw bytes and extracted text),
+    and the least recently used entries are evicted until the new one fits into the budget.
     Cache is thread-safe, and it uses a lock to prevent threading issues.
+    The lock is not held during downloads: concurrent requests for the same file wait for the download
+    in flight instead of starting a new one, while the requests for other files are not blocked.
+
+    If a shared backend is provided, the in-memory cache acts as a per-worker L1 tier in front of it,
+    and files are downloaded and parsed only once per host.
     """
 
     def __init__(
         self,
         client: WorkspaceClient,
         volume_path: PosixPath,
-        max_size: int = 100,
+        max_bytes: int = 1024 * 1024 * 1024,
         ttl_in_seconds: int = 3600,
+        backend: CacheBackend | None = None,
     ):
-        self._cache: TTLCache[PosixPath, FileContent] = TTLCache(
-            maxsize=max_size, ttl=ttl_in_seconds
+        self._cache: TTLCache[PosixPath, FileContent] = InstrumentedTTLCache(
+            "files",
+            maxsize=max_bytes,
+            ttl=ttl_in_seconds,
+            getsizeof=lambda content: content.nbytes,
         )  # Auto eviction after TTL
         self._client = client
         self._volume_path = volume_path
+        self._ttl_in_seconds = ttl_in_seconds
+        self._backend = backend
 
         # we need lock to prevent threading issues
         self._lock = Lock()
+        self._in_flight: dict[PosixPath, Future[FileContent]] = {}
+
+        CACHE_BYTES.labels("files").set_function(lambda: self._cache.currsize)
+        CACHE_MAX_BYTES.labels("files").set(max_bytes)
+        CACHE_ENTRIES.labels("files").set_function(lambda: len(self._cache))
 
-    def download_file(self, path: PosixPath) -> None:
+    def _download(self, path: PosixPath) -> FileContent:
+        from pypdf import PdfReader
+
+        full_path = self._volume_path / path
+        logger.info(f"Downloading file: {full_path} from Volume into cache")
+        with FILE_DOWNLOAD_LATENCY.time():
+            response = self._client.files.download(
+                full_path.as_posix()
+            )
+            raw = response.contents.read()
+        with FILE_EXTRACTION_LATENCY.time():
+            reader = PdfReader(BytesIO(raw))
+            extracted_pages = [page.extract_text() for page in reader.pages]
+        logger.info(f"Downloaded file: {full_path}")
+        return FileContent(raw=raw, extracted_pages=extracted_pages)
+
+    def _load(self, path: PosixPath) -> FileContent:
+        """Loads the file from the shared backend, downloading it only if no other worker did it already."""
+        if self._backend is None:
+            return self._download(path)
+
+        key = path.as_posix()
+        value = self._backend.get("files", key)
+        if value is None:
+            with self._backend.lock("files", key):
+                # another worker might have downloaded the file while we were waiting for the lock
+                value = self._backend.get("files", key)
+                if value is None:
+                    CACHE_MISSES.labels("files_shared").inc()
+                    content = self._download(path)
+                    self._backend.set(
+                        "files", key, content.to_bytes(), self._ttl_in_seconds
+                    )
+                    return content
+
+        CACHE_HITS.labels("files_shared").inc()
+        return FileContent.from_bytes(value)
+
+    def download_file(self, path: PosixPath) -> FileContent:
         """
         Path should be just the file name, not the full path.
+        Returns the file content, which is also cached unless it exceeds the whole cache budget.
+        If the file is already being downloaded, waits for that download instead of starting a new one.
         """
         with self._lock:
-            if path not in self._cache:
-                full_path = self._volume_path / path
-                logger.info(f"Downloading file: {full_path} from Volume into cache")
-                response: DownloadResponse = self._client.files.download(
-                    full_path.as_posix()
-                )
-                raw = response.contents.read()
-                reader = PdfReader(BytesIO(raw))
-                extracted_pages = [page.extract_text() for page in reader.pages]
-                self._cache[path] = FileContent(
-                    raw=raw, extracted_pages=extracted_pages
-                )
-                logger.info(f"Downloaded file: {full_path}")
+            if path in self._cache:
+                CACHE_HITS.labels("files").inc()
+                logger.debug(f"File {path} already in cache, skipping download")
+                return self._cache[path]
+
+            future = self._in_flight.get(path)
+            if future is None:
+                CACHE_MISSES.labels("files").inc()
+                future = self._in_flight[path] = Future()
+                owner = True
             else:
-                logger.info(f"File {path} already in cache, skipping download")
+                owner = False
+
+        if not owner:
+            return future.result()
+
+        try:
+            content = self._load(path)
+        except Exception as exc:
+            with self._lock:
+                del self._in_flight[path]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            try:
+                self._cache[path] = content
+            except ValueError:
+                # cachetools raises ValueError if a single value is larger than maxsize
+                logger.warning(
+                    f"File {path} ({content.nbytes} bytes) exceeds the cache budget, not caching it"
+                )
+            del self._in_flight[path]
+
+        future.set_result(content)
+        return content
+
+    async def get(self, path: PosixPath) -> FileContent:
+        """Async version of `download_file`: awaits the download in flight without blocking a worker thread."""
+        with self._lock:
+            if path in self._cache:
+                CACHE_HITS.labels("files").inc()
+                return self._cache[path]
+            future = self._in_flight.get(path)
+
+        if future is not None:
+            return await asyncio.wrap_future(future)
+        return await run_in_threadpool(self.download_file, path)
 
     def get_as_iterable(
         self, path: PosixPath, chunk_size: int = 10 * 1024 * 1024
     ) -> Generator[bytes, None, None]:
         """Returns an iterator with file chunks."""
 
-        # retry 2-3 times if file not in cache, usually happens while file is being downloaded
-        found = False
-        for _ in range(3):
-            time.sleep(0.5)
-            with self._lock:
-                if path in self._cache:
-                    found = True
-                    break
+        # returns the cached content, or waits for the download in progress, or downloads the file. The content is taken from the return value rather than the cache,
+        # since it might have been evicted (or not cached at all) in the meantime.
+        content = self.download_file(path)
+
+        return iter(functools.partial(content.as_io.read, chunk_size), b"")
+
+class PdfSlice(BaseModel):
+    content: bytes
+    first_page: int
+    last_page: int
+    num_pages: int  # total amount of pages in the original file
+
+
+class SliceCache:
+    """Cache of the PDF slices (page windows) built from the files in the FileCache.
+
+    Slices are keyed by the file and the page range and weighted by their size in bytes,
+    the least recently used ones are evicted when the byte budget is exceeded.
+    """
 
-        # if file not found in cache after retries, download it
-        if not found:
-            self.download_file(path)
+    def __init__(
+        self,
+        file_cache: FileCache,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_in_seconds: int = 3600,
+    ):
+        self._file_cache = file_cache
+        self._cache: TTLCache[tuple[PosixPath, int, int], PdfSlice] = InstrumentedTTLCache(
+            "slices",
+            maxsize=max_bytes,
+            ttl=ttl_in_seconds,
+            getsizeof=lambda pdf_slice: len(pdf_slice.content),
+        )
+        self._lock = Lock()
+
+        CACHE_BYTES.labels("slices").set_function(lambda: self._cache.currsize)
+        CACHE_MAX_BYTES.labels("slices").set(max_bytes)
+        CACHE_ENTRIES.labels("slices").set_function(lambda: len(self._cache))
+
+    async def get(self, path: PosixPath, page_num: int, window: int) -> PdfSlice:
+        content = await self._file_cache.get(path)
+        first_page, last_page = content.page_range(page_num, window)
+        key = (path, first_page, last_page)
 
         with self._lock:
-            content = self._cache[path]
+            cached = self._cache.get(key)
+        if cached is not None:
+            CACHE_HITS.labels("slices").inc()
+            return cached
+
+        CACHE_MISSES.labels("slices").inc()
+        pdf_slice = PdfSlice(
+            content=await run_in_threadpool(content.slice, first_page, last_page),
+            first_page=first_page,
+            last_page=last_page,
+            num_pages=content.num_pages,
+        )
+        with self._lock:
+            try:
+                self._cache[key] = pdf_slice
+            except ValueError:
+                logger.warning(f"Slice {key} exceeds the slice cache budget, not caching it")
+        return pdf_slice
 
-        return iter(functools.partial(content.as_io.read, chunk_size), b"")
 
 class ResponsesCache:
-    def __init__(self):
-        self._responses: TTLCache[ChatRequest, ApiChatResponse] = TTLCache(maxsize=100, ttl=60*2)  # 2 minutes
+    """Cache for the agent responses.
+
+    Keys combine the digest of the conversation prefix and the new message,
+    so the same question asked in different conversations is not mixed up,
+    while identical conversations (e.g. the same first question) still share the cached answer.
+    """
+
+    def __init__(self, backend: CacheBackend | None = None, ttl_in_seconds: int = 60 * 2):
+        self._responses: TTLCache[str, ApiChatResponse] = InstrumentedTTLCache(
+            "responses", maxsize=100, ttl=ttl_in_seconds
+        )  # 2 minutes by default
+        self._ttl_in_seconds = ttl_in_seconds
+        self._backend = backend
         self._lock = Lock()
 
-    def __contains__(self, request: ChatRequest) -> bool:
+        CACHE_BYTES.labels("responses").set_function(self._nbytes)
+        CACHE_ENTRIES.labels("responses").set_function(lambda: len(self._responses))
+
+    def _nbytes(self) -> int:
         with self._lock:
-            result = request in self._responses
-            logger.info(f"Checking if request {request} is in cache, actual {result}")
-            return result
+            return sum(
+                len(response.content) + sum(len(meta.content) for meta in response.metadata)
+                for response in self._responses.values()
+            )
+
+    @staticmethod
+    def key(prefix_digest: str, message: str) -> str:
+        return f"{prefix_digest}:{message}"
+
+    def _load_shared(self, key: str) -> ApiChatResponse | None:
+        """Looks up the shared backend and promotes the found response into the local cache."""
+        if self._backend is None:
+            return None
+
+        value = self._backend.get("responses", key)
+        if value is None:
+            CACHE_MISSES.labels("responses_shared").inc()
+            return None
 
-    def get(self, request: ChatRequest) -> ApiChatResponse:
+        CACHE_HITS.labels("responses_shared").inc()
+        response = ApiChatResponse.model_validate_json(value)
         with self._lock:
-            return self._responses.get(request, None)
+            self._responses[key] = response
+        return response
 
-    def set(self, request: ChatRequest, response: ApiChatResponse) -> None:
+    def get(self, key: str) -> ApiChatResponse | None:
+        """Cached response, None on a miss. There's no separate membership check,
+        since the entry could expire between the check and the lookup.
+        """
+        with self._lock:
+            response = self._responses.get(key, None)
+        (CACHE_HITS if response is not None else CACHE_MISSES).labels("responses").inc()
+        return response if response is not None else self._load_shared(key)
+
+    def set(self, key: str, response: ApiChatResponse) -> None:
         with self._lock:
-            self._responses[request] = response
+            self._responses[key] = response
+        if self._backend is not None:
+            self._backend.set(
+                "responses", key, response.model_dump_json().encode(), self._ttl_in_seconds
+            )
+
+class StartupStatus(BaseModel):
+    """Progress of the app initialization that happens in the background after the app starts serving."""
+
+    ready: bool = False
+    startup_seconds: float | None = None
+    error: str | None = None
+
 
 class AppState(State):
     """State class for storing the client and file cache.
     We're using subclassing to add strong typing.
+
+    All the members are created lazily on first use, so that importing the app stays cheap
+    and the config parsing and client initialization happen when the app is already serving.
     """
 
-    def __init__(self, state=None):
-        super().__init__(state)
-        self.config = Config()
-        logger.info(f"Config: {self.config.model_dump_json(indent=4)}")
-        self.client = WorkspaceClient(profile=self.config.profile)
-        self.file_cache = FileCache(self.client, self.config.full_raw_docs_path)
-        self.responses_cache = ResponsesCache()
+    @lazy_property
+    def startup(self) -> StartupStatus:
+        return StartupStatus()
+
+    @lazy_property
+    def config(self) -> Config:
+        config = Config()
+        logger.info(f"Config: {config.model_dump_json(indent=4)}")
+        return config
+
+    @lazy_property
+    def client(self) -> WorkspaceClient:
+        if self.config.workspace_backend == "fake":
+            from chatten_app.fakes import FakeWorkspaceClient
+
+            return FakeWorkspaceClient(
+                self.config, retry_timeout_seconds=self.config.upstream_retry_timeout_seconds
+            )
+
+        from databricks.sdk import WorkspaceClient
+
+        return WorkspaceClient(profile=self.config.profile)
+
+    @lazy_property
+    def agent_client(self) -> WorkspaceClient:
+        """Client of the agent endpoint calls, with the SDK retries bounded by the chat deadline.
+        With the default client, a rate-limited call would be retried by the SDK for 5 minutes,
+        way past the deadline, while keeping its admission slot.
+        """
+        if self.config.workspace_backend == "fake":
+            return self.client
+
+        from databricks.sdk import WorkspaceClient
+        from databricks.sdk.config import Config as SdkConfig
+
+        return WorkspaceClient(
+            config=SdkConfig(
+                profile=self.config.profile,
+                retry_timeout_seconds=self.config.upstream_retry_timeout_seconds,
+            )
+        )
+
+    @lazy_property
+    def cache_backend(self) -> CacheBackend | None:
+        if self.config.cache_backend == "sqlite":
+            return SQLiteCacheBackend(
+                self.config.cache_dir,
+                budgets={
+                    "files": self.config.shared_file_cache_max_bytes,
+                    "responses": self.config.shared_responses_cache_max_bytes,
+                    "conversations": self.config.shared_conversations_max_bytes,
+                },
+            )
+        return None
+
+    @lazy_property
+    def file_cache(self) -> FileCache:
+        return FileCache(
+            self.client,
+            self.config.full_raw_docs_path,
+            max_bytes=self.config.file_cache_max_bytes,
+            ttl_in_seconds=self.config.file_cache_ttl_in_seconds,
+            backend=self.cache_backend,
+        )
+
+    @lazy_property
+    def slice_cache(self) -> SliceCache:
+        return SliceCache(
+            self.file_cache,
+            max_bytes=self.config.slice_cache_max_bytes,
+            ttl_in_seconds=self.config.file_cache_ttl_in_seconds,
+        )
+
+    @lazy_property
+    def responses_cache(self) -> ResponsesCache:
+        return ResponsesCache(backend=self.cache_backend)
+
+    @lazy_property
+    def chat_admission(self) -> AdmissionController:
+        return AdmissionController(
+            "chat",
+            max_concurrency=self.config.chat_max_concurrency,
+            max_queue=self.config.chat_max_queue,
+            queue_timeout_seconds=self.config.chat_queue_timeout_seconds,
+            retry_after_seconds=self.config.chat_retry_after_seconds,
+        )
+
+    @lazy_property
+    def conversations(self) -> ConversationStore:
+        return ConversationStore(
+            max_sessions=self.config.max_sessions,
+            ttl_in_seconds=self.config.session_ttl_in_seconds,
+            backend=self.cache_backend,
+        )
+
+    @lazy_property
+    def access_log(self) -> AccessLog:
+        return AccessLog(
+            self.client,
+            self.config.full_access_log_path,
+            half_life_seconds=self.config.access_log_half_life_hours * 3600,
+        )
+
+    @lazy_property
+    def warmer(self) -> Warmer:
+        return Warmer(
+            self.file_cache,
+            self.access_log,
+            memory_budget_bytes=self.config.warmup_memory_budget_bytes,
+            min_interval_seconds=self.config.warmup_min_interval_seconds,
+            is_busy=lambda: requests_in_flight() > 0,
+        )
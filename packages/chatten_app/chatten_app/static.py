@@ -0,0 +1,173 @@
+from __future__ import annotations
+import gzip
+import hashlib
+import mimetypes
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+
+import dash
+from dash.fingerprint import check_fingerprint
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency, gzip is used if brotli is not installed
+    brotli = None
+
+
+FINGERPRINTED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# small files are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+
+@dataclass
+class StaticFile:
+    """File content with its precompressed variants, prepared once and reused for all requests."""
+
+    path: Path
+    mtime: float
+    media_type: str
+    etag: str
+    variants: dict[str, bytes] = field(default_factory=dict)  # encoding -> content
+
+    @classmethod
+    def load(cls, path: Path) -> StaticFile:
+        raw = path.read_bytes()
+        media_type, _ = mimetypes.guess_type(path.name)
+        variants = {"identity": raw}
+        if len(raw) >= MIN_COMPRESS_SIZE:
+            variants["gzip"] = gzip.compress(raw, compresslevel=9)
+            if brotli is not None:
+                variants["br"] = brotli.compress(raw)
+        return cls(
+            path=path,
+            mtime=path.stat().st_mtime,
+            media_type=media_type or "application/octet-stream",
+            # weak ETag, since the same content is served in different encodings
+            etag=f'W/"{hashlib.md5(raw).hexdigest()}"',
+            variants=variants,
+        )
+
+    def pick_encoding(self, accept_encoding: str) -> str:
+        accepted = {value.split(";")[0].strip() for value in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return encoding
+        return "identity"
+
+
+class DashStaticFiles:
+    """ASGI app serving the static assets of a Dash app natively, without the WSGI bridge.
+
+    Component suites (including the chatten_ui bundle) and the assets folder are served from memory
+    with precompressed gzip/brotli variants and cache headers - fingerprinted URLs are cached forever,
+    the rest is revalidated via ETag. Everything else (index page, callbacks) goes to the fallback WSGI app.
+    Paths that are not registered by Dash yet (e.g. before the index page is rendered for the first time)
+    also go to the fallback, which keeps the Dash validation semantics intact.
+    """
+
+    def __init__(self, dash_app: dash.Dash, fallback: ASGIApp):
+        self._dash_app = dash_app
+        self._fallback = fallback
+        prefix = dash_app.config.requests_pathname_prefix.rstrip("/")
+        self._suites_prefix = f"{prefix}/_dash-component-suites/"
+        self._assets_prefix = f"{prefix}/{dash_app.config.assets_url_path.strip('/')}/"
+        self._files: dict[Path, StaticFile] = {}
+        self._lock = Lock()
+
+    def _resolve_component(self, path: str) -> tuple[Path, bool] | None:
+        package_name, _, fingerprinted_path = path.partition("/")
+        path_in_pkg, has_fingerprint = check_fingerprint(fingerprinted_path)
+
+        registered = self._dash_app.registered_paths.get(package_name, set())
+        if path_in_pkg not in registered or package_name not in sys.modules:
+            return None
+
+        package_dir = Path(sys.modules[package_name].__file__).parent
+        return package_dir / path_in_pkg, has_fingerprint
+
+    def _resolve_asset(self, path: str, query_string: bytes) -> tuple[Path, bool] | None:
+        assets_dir = Path(self._dash_app.config.assets_folder).resolve()
+        file_path = (assets_dir / path).resolve()
+        if not file_path.is_relative_to(assets_dir):
+            return None
+        # Dash appends the modification time as the "m" query parameter to the assets URLs
+        has_fingerprint = b"m=" in query_string
+        return file_path, has_fingerprint
+
+    def _resolve(self, scope: Scope) -> tuple[Path, bool] | None:
+        path: str = scope["path"][len(scope.get("root_path", "")) :] or "/"
+        if path.startswith(self._suites_prefix):
+            return self._resolve_component(path[len(self._suites_prefix) :])
+        if path.startswith(self._assets_prefix):
+            return self._resolve_asset(
+                path[len(self._assets_prefix) :], scope.get("query_string", b"")
+            )
+        return None
+
+    def _cached(self, path: Path, has_fingerprint: bool) -> StaticFile | None:
+        """Returns the prepared file if it's still fresh. Fingerprinted files are never re-checked."""
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is None:
+            return None
+        if has_fingerprint or cached.mtime == path.stat().st_mtime:
+            return cached
+        return None
+
+    def _load(self, path: Path) -> StaticFile | None:
+        if not path.is_file():
+            return None
+        static_file = StaticFile.load(path)
+        with self._lock:
+            self._files[path] = static_file
+        return static_file
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            resolved = self._resolve(scope)
+            if resolved is not None:
+                file_path, has_fingerprint = resolved
+                # only the first request for a file (read + compression) goes to the threadpool
+                static_file = self._cached(file_path, has_fingerprint) or await run_in_threadpool(
+                    self._load, file_path
+                )
+                if static_file is not None:
+                    response = self._response(
+                        static_file, has_fingerprint, Headers(scope=scope)
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        await self._fallback(scope, receive, send)
+
+    def _response(
+        self, static_file: StaticFile, has_fingerprint: bool, request_headers: Headers
+    ) -> Response:
+        headers = {
+            "Cache-Control": FINGERPRINTED_CACHE_CONTROL
+            if has_fingerprint
+            else REVALIDATE_CACHE_CONTROL,
+            "ETag": static_file.etag,
+            "Vary": "Accept-Encoding",
+        }
+
+        if request_headers.get("if-none-match") == static_file.etag:
+            return Response(status_code=304, headers=headers)
+
+        encoding = static_file.pick_encoding(request_headers.get("accept-encoding", ""))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        return Response(
+            static_file.variants[encoding],
+            media_type=static_file.media_type,
+            headers=headers,
+        )
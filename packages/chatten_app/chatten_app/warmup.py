@@ -0,0 +1,205 @@
+from __future__ import annotations
+import asyncio
+import json
+import math
+import time
+from io import BytesIO
+from pathlib import PosixPath
+from threading import Lock
+from typing import TYPE_CHECKING, Callable
+
+from loguru import logger
+from pydantic import BaseModel, computed_field
+
+from chatten_app.metrics import (
+    WARMUP_BYTES,
+    WARMUP_FILES,
+    WARMUP_HIT_RATE,
+)
+
+if TYPE_CHECKING:
+    from databricks.sdk import WorkspaceClient
+    from chatten_app.state import FileCache
+
+# sources mentioned in the answers are a weaker signal than the files actually opened by the users
+SOURCE_WEIGHT = 0.5
+
+
+class AccessLog:
+    """Lightweight log of the file accesses with exponentially decayed counts.
+
+    Each access adds a weight to the file score, and scores halve every `half_life_seconds`,
+    so recently popular files win over the files that were popular a long time ago.
+    The log is persisted as a small JSON file in the Volume, to survive app redeploys.
+    """
+
+    def __init__(
+        self,
+        client: WorkspaceClient,
+        path: PosixPath,
+        half_life_seconds: float,
+    ):
+        self._client = client
+        self._path = path
+        self._decay_rate = math.log(2) / half_life_seconds
+        self._scores: dict[str, tuple[float, float]] = {}  # name -> (score, last update)
+        self._dirty = False
+        self._lock = Lock()
+
+    def _decayed(self, score: float, updated_at: float, now: float) -> float:
+        return score * math.exp(-self._decay_rate * (now - updated_at))
+
+    def record(self, path: PosixPath, weight: float = 1.0) -> None:
+        now = time.time()
+        with self._lock:
+            score, updated_at = self._scores.get(path.as_posix(), (0.0, now))
+            self._scores[path.as_posix()] = (
+                self._decayed(score, updated_at, now) + weight,
+                now,
+            )
+            self._dirty = True
+
+    def hottest(self) -> list[tuple[PosixPath, float]]:
+        """Files sorted by their current decayed score, hottest first."""
+        now = time.time()
+        with self._lock:
+            scores = [
+                (PosixPath(name), self._decayed(score, updated_at, now))
+                for name, (score, updated_at) in self._scores.items()
+            ]
+        return sorted(scores, key=lambda item: item[1], reverse=True)
+
+    def load(self) -> None:
+        try:
+            raw = self._client.files.download(self._path.as_posix()).contents.read()
+        except Exception as e:
+            logger.info(f"No access log loaded from {self._path}: {e}")
+            return
+
+        with self._lock:
+            self._scores = {
+                name: (score, updated_at)
+                for name, (score, updated_at) in json.loads(raw).items()
+            }
+        logger.info(f"Loaded access log with {len(self._scores)} files")
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._scores).encode()
+            self._dirty = False
+
+        try:
+            self._client.files.upload(
+                self._path.as_posix(), BytesIO(payload), overwrite=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to persist the access log to {self._path}: {e}")
+            with self._lock:
+                self._dirty = True
+
+
+class WarmupStatus(BaseModel):
+    planned_files: int = 0
+    planned_bytes: int = 0
+    done_files: int = 0
+    failed_files: int = 0
+    finished: bool = False
+    accesses: int = 0
+    warm_hits: int = 0
+
+    @computed_field
+    @property
+    def hit_rate(self) -> float:
+        return self.warm_hits / self.accesses if self.accesses else 0.0
+
+
+class Warmer:
+    """Preloads the hottest files into the file cache.
+
+    Files are picked by the access log scores within the memory budget
+    (falling back to the largest files if there is no access history yet),
+    and are downloaded one by one at a limited rate, pausing while there are live requests in flight.
+    """
+
+    def __init__(
+        self,
+        file_cache: FileCache,
+        access_log: AccessLog,
+        memory_budget_bytes: int,
+        min_interval_seconds: float,
+        is_busy: Callable[[], bool],
+    ):
+        self._file_cache = file_cache
+        self._access_log = access_log
+        self._memory_budget_bytes = memory_budget_bytes
+        self._min_interval_seconds = min_interval_seconds
+        self._is_busy = is_busy
+        self._warmed: set[PosixPath] = set()
+        self.status = WarmupStatus()
+        # the accesses are recorded from the threadpool workers, concurrently with the warmup loop
+        self._lock = Lock()
+
+        WARMUP_FILES.labels("planned").set_function(lambda: self.status.planned_files)
+        WARMUP_FILES.labels("done").set_function(lambda: self.status.done_files)
+        WARMUP_FILES.labels("failed").set_function(lambda: self.status.failed_files)
+        WARMUP_BYTES.set_function(lambda: self.status.planned_bytes)
+        WARMUP_HIT_RATE.set_function(lambda: self.status.hit_rate)
+
+    def plan(
+        self, sizes: dict[PosixPath, int], fallback_max_files: int
+    ) -> list[PosixPath]:
+        """Selects the files to preload, given the sizes of the files available in the Volume."""
+        candidates = [path for path, _ in self._access_log.hottest() if path in sizes]
+
+        if not candidates:
+            logger.info("No access history yet, falling back to the largest files")
+            candidates = sorted(sizes, key=sizes.get, reverse=True)[:fallback_max_files]
+
+        planned, used = [], 0
+        for path in candidates:
+            if used + sizes[path] > self._memory_budget_bytes:
+                continue
+            planned.append(path)
+            used += sizes[path]
+
+        with self._lock:
+            self.status = WarmupStatus(planned_files=len(planned), planned_bytes=used)
+        return planned
+
+    def record_source(self, path: PosixPath) -> None:
+        """Records a file mentioned as a source in the answer."""
+        self._access_log.record(path, SOURCE_WEIGHT)
+
+    def record_access(self, path: PosixPath) -> None:
+        """Records a file opened by the user and tracks if it was served thanks to the warmup."""
+        self._access_log.record(path)
+        with self._lock:
+            self.status.accesses += 1
+            if path in self._warmed:
+                self.status.warm_hits += 1
+
+    async def run(self, files: list[PosixPath]) -> None:
+        for path in files:
+            while self._is_busy():
+                await asyncio.sleep(self._min_interval_seconds)
+
+            try:
+                await asyncio.to_thread(self._file_cache.download_file, path)
+                with self._lock:
+                    self._warmed.add(path)
+                    self.status.done_files += 1
+            except Exception as exc:
+                with self._lock:
+                    self.status.failed_files += 1
+                logger.warning(f"Warmup download of {path} failed with: {exc}")
+
+            logger.debug(
+                f"Warmup progress: {self.status.done_files + self.status.failed_files}/{self.status.planned_files}"
+            )
+            await asyncio.sleep(self._min_interval_seconds)
+
+        with self._lock:
+            self.status.finished = True
+        logger.info(f"Warmup finished: {self.status.model_dump()}")
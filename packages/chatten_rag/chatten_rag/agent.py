@@ -1,12 +1,16 @@
 import json
-from typing import Iterator
-from databricks_langchain import ChatDatabricks
-from mlflow.langchain.output_parsers import ChatCompletionOutputParser
+from databricks_langchain import ChatDatabricks, DatabricksEmbeddings
 from langgraph.prebuilt import create_react_agent
-from langchain_core.runnables import RunnableGenerator
+from langchain_core.runnables import RunnableLambda
 from langgraph.pregel.io import AddableValuesDict
 from langchain_core.documents import Document
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from mlflow.types.llm import (
+    ChatChoice,
+    ChatCompletionResponse,
+    ChatMessage,
+    TokenUsageStats,
+)
 
 from databricks_langchain import VectorSearchRetrieverTool
 from mlflow.models import ModelConfig
@@ -21,15 +25,55 @@ class SerializedVectorSearchRetrieverTool(VectorSearchRetrieverTool):
         return json.dumps(_serialized)
 
 
-def get_agent(chat_model: str, vsi: str, prompt: str):
-    retriever_tool = SerializedVectorSearchRetrieverTool(
+TOOL_DESCRIPTION = "Search through document corpus stored in Vector Search Index. Provides helpful insights about Databricks."
+
+
+def get_retriever_tool(
+    retriever: str,
+    vsi: str,
+    embeddings_endpoint: str,
+    local_index_path: str,
+    local_index_n_probe: int,
+):
+    if retriever == "local":
+        # shipped with the agent via code_paths, imported only when the local index is used
+        from chatten_rag.local_index import (
+            LocalRetrieverTool,
+            LocalVectorIndex,
+            resolve_index_path,
+        )
+
+        embeddings = DatabricksEmbeddings(endpoint=embeddings_endpoint)
+        return LocalRetrieverTool(
+            description=TOOL_DESCRIPTION,
+            index=LocalVectorIndex(resolve_index_path(local_index_path)),
+            embed_query=embeddings.embed_query,
+            num_results=3,
+            n_probe=local_index_n_probe,
+        )
+
+    return SerializedVectorSearchRetrieverTool(
         index_name=vsi,
         num_results=3,
         tool_name="retriever",
-        tool_description="Search through document corpus stored in Vector Search Index. Provides helpful insights about Databricks.",
+        tool_description=TOOL_DESCRIPTION,
         columns=["path"],
     )
 
+
+def _retrieved_documents(message: ToolMessage) -> list[dict]:
+    """Documents serialized by the retriever tool. A failed tool call returns a plain error message
+    instead, it's skipped so that the answer is still returned, without its sources.
+    """
+    try:
+        documents = json.loads(message.content)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return documents if isinstance(documents, list) else []
+
+
+def get_agent(chat_model: str, prompt: str, retriever_tool):
+
     llm = ChatDatabricks(endpoint=chat_model)
 
     raw_agent = create_react_agent(
@@ -38,20 +82,50 @@ def get_agent(chat_model: str, vsi: str, prompt: str):
         prompt=prompt,
     )
 
-    def wrap_output(stream: Iterator[AddableValuesDict]) -> Iterator[str]:
-
-        for event in stream:
-
-            if "agent" in event:
-                messages: list[BaseMessage] = event["agent"]["messages"]
-
-            elif "messages" in event:
-                messages: list[BaseMessage] = event["messages"]
-
-            packed_messages = [message.model_dump() for message in messages]
-            yield json.dumps(packed_messages)
-
-    _agent = raw_agent | RunnableGenerator(wrap_output) | ChatCompletionOutputParser()
+    def to_chat_completion(state: AddableValuesDict) -> dict:
+        """Returns the final answer as the message content and the retrieved sources as custom outputs,
+        so that the clients get a plain chat completion instead of all the messages packed in a string.
+        """
+        messages: list[BaseMessage] = state["messages"]
+
+        answer = next(
+            (
+                message.content
+                for message in reversed(messages)
+                if isinstance(message, AIMessage) and message.content
+            ),
+            "",
+        )
+        sources = [
+            {"query": doc["page_content"], "path": doc["metadata"]["path"]}
+            for message in messages
+            if isinstance(message, ToolMessage)
+            for doc in _retrieved_documents(message)
+        ]
+
+        # token usage of all the LLM calls of the agent loop, not only the final answer
+        usages = [
+            message.usage_metadata
+            for message in messages
+            if isinstance(message, AIMessage) and message.usage_metadata
+        ]
+        usage = (
+            TokenUsageStats(
+                prompt_tokens=sum(u["input_tokens"] for u in usages),
+                completion_tokens=sum(u["output_tokens"] for u in usages),
+                total_tokens=sum(u["total_tokens"] for u in usages),
+            )
+            if usages
+            else None
+        )
+
+        return ChatCompletionResponse(
+            choices=[ChatChoice(message=ChatMessage(role="assistant", content=answer))],
+            usage=usage,
+            custom_outputs={"sources": sources},
+        ).to_dict()
+
+    _agent = raw_agent | RunnableLambda(to_chat_completion)
     return _agent
 
 
@@ -59,8 +133,14 @@ config = ModelConfig(development_config="config.yml")
 
 agent = get_agent(
     config.get("chat_endpoint"),
-    config.get("vsi"),
     config.get("PROMPT"),
+    get_retriever_tool(
+        config.get("retriever"),
+        config.get("vsi"),
+        config.get("embeddings_endpoint"),
+        config.get("local_index_path"),
+        config.get("local_index_n_probe"),
+    ),
 )
 
 mlflow.models.set_model(agent)
@@ -1,5 +1,7 @@
+import hashlib
+import json
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar
+from typing import Any, Generic, TypeVar
 from pyspark.sql import SparkSession
 from loguru import logger
 from chatten.config import Config
@@ -8,34 +10,72 @@ from databricks.sdk import WorkspaceClient
 T = TypeVar("T", bound=Config)
 
 
+def fingerprint_of(*parts: Any) -> str:
+    """Stable hash of JSON-serializable parts, used to detect changes of the task inputs."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
 class Task(ABC, Generic[T]):
     config_class: T
 
-    def __init__(self):
-        self.spark: SparkSession = SparkSession.builder.getOrCreate()
+    def __init__(
+        self,
+        spark: SparkSession | None = None,
+        client: WorkspaceClient | None = None,
+        config: T | None = None,
+    ):
+        # spark, client and config can be shared by the tasks running in the same process
+        self.spark: SparkSession = spark or SparkSession.builder.getOrCreate()
         self.logger = logger
-        self.config: T = self.config_class()
-        self.client = WorkspaceClient(profile=self.config.profile)
+        self.config: T = config or self.config_class()
+        self.client = client or WorkspaceClient(profile=self.config.profile)
 
     @abstractmethod
     def run(self):
         """Run the task"""
 
+    def fingerprint(self) -> str | None:
+        """Hash of the task inputs. The pipeline skips the task if it didn't change since the last run.
+        None means that the inputs can't be fingerprinted and the task always runs.
+        """
+        return None
+
+    def outputs_exist(self) -> bool:
+        """Whether the outputs of the last run are still there. The pipeline reruns the task if they aren't,
+        even if its inputs didn't change (e.g. the artifacts were deleted by the cleanup script).
+        """
+        return True
+
+    def docs_table_version(self) -> str | None:
+        """Table id and latest Delta version of the docs table, None if the table doesn't exist yet.
+        The versions start over when the table is recreated, the id tells the two tables apart.
+        """
+        table = self.config.docs_with_catalog
+        if not self.spark.catalog.tableExists(table):
+            return None
+        table_id = self.spark.sql(f"DESCRIBE DETAIL {table}").first()["id"]
+        version = self.spark.sql(f"DESCRIBE HISTORY {table} LIMIT 1").first()["version"]
+        return f"{table_id}@{version}"
+
+    def setup(self):
+        """Prepare the catalog, database and volume used by the tasks."""
+        self.logger.info(f"Setting catalog to {self.config.catalog}")
+        self.spark.sql(f"USE CATALOG {self.config.catalog}")
+
+        self.logger.info(f"Setting database to {self.config.db}")
+        self.spark.sql(f"CREATE DATABASE IF NOT EXISTS {self.config.db}")
+        self.spark.sql(f"USE DATABASE {self.config.db}")
+
+        self.logger.info(f"Setting the volume to {self.config.volume}")
+        self.spark.sql(f"CREATE VOLUME IF NOT EXISTS {self.config.volume}")
+
     @classmethod
     def entrypoint(cls):
         logger.info(f"Running {cls.__name__}")
         instance = cls()
         logger.info(f"Config: {instance.config.model_dump_json(indent=4)}")
 
-        logger.info(f"Setting catalog to {instance.config.catalog}")
-        instance.spark.sql(f"USE CATALOG {instance.config.catalog}")
-
-        logger.info(f"Setting database to {instance.config.db}")
-        instance.spark.sql(f"CREATE DATABASE IF NOT EXISTS {instance.config.db}")
-        instance.spark.sql(f"USE DATABASE {instance.config.db}")
-
-        logger.info(f"Setting the volume to {instance.config.volume}")
-        instance.spark.sql(f"CREATE VOLUME IF NOT EXISTS {instance.config.volume}")
-
+        instance.setup()
         instance.run()
         logger.info(f"Finished running {cls.__name__}")
@@ -0,0 +1,300 @@
+"""Local vector index, an alternative to Databricks Vector Search for dev, testing and latency-sensitive serving.
+
+The chunk embeddings are stored as a NumPy matrix and memory-mapped on load, so the index opens instantly
+and only the pages that are actually scanned are read. The embeddings are L2-normalized, so a batch of queries
+is scored against the corpus with a single matrix product (cosine similarity).
+For large corpora, the rows can be partitioned into IVF lists (spherical k-means): the rows of each list are
+stored contiguously and only the lists closest to the query are scanned.
+
+This module is shipped with the agent (via code_paths), so it only depends on NumPy and LangChain core.
+"""
+
+from __future__ import annotations
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, ConfigDict
+
+# rows scored at once, bounds the memory of the scores when scanning a large matrix
+BLOCK_ROWS = 65536
+
+# k-means is trained on a sample of the corpus, with this amount of rows per list
+KMEANS_SAMPLE_PER_LIST = 64
+
+
+@dataclass
+class Chunk:
+    chunk_uuid: str
+    path: str
+    chunk_text: str
+
+
+@dataclass
+class SearchResult:
+    chunk: Chunk
+    score: float
+
+
+def _normalize(vectors: Sequence[Sequence[float]] | np.ndarray, dim: int | None = None) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.size == 0 and dim is not None:
+        return vectors.reshape(0, dim)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k highest scores in each row, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), scores[:, :0]
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-top, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Closest centroid of each vector."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = vectors[start : start + BLOCK_ROWS]
+        assignments[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, n_iter: int, seed: int) -> np.ndarray:
+    """Spherical k-means, trained on a sample of the vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+
+    for _ in range(n_iter):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]  # empty lists keep their previous centroid
+        centroids = _normalize(sums)
+
+    return centroids
+
+
+def _save(path: Path, write: Callable[[Path], None]) -> None:
+    """Writes the file next to its final location and moves it in place,
+    so that the readers never see a partially written file.
+    """
+    tmp_path = path.with_name(f".{path.stem}.tmp{path.suffix}")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class LocalVectorIndex:
+    """Index files in a directory: the normalized embeddings matrix, the chunks and the IVF lists (if any).
+    The manifest records the embeddings endpoint and the dimension of the vectors.
+
+    The index is immutable once written, updates write a new version of the files
+    (see `updated`) and return a new index instance.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        manifest = json.loads((self.directory / "manifest.json").read_text())
+        self.dim: int = manifest["dim"]
+        self.version: str | None = manifest["version"]
+        # indexes written before the endpoint was recorded have none, they are rebuilt on the next refresh
+        self.embeddings_endpoint: str | None = manifest.get("embeddings_endpoint")
+        self.n_lists: int = manifest["n_lists"]
+        self.trained_size: int = manifest["trained_size"]
+
+        self.embeddings: np.ndarray = np.load(self.directory / "embeddings.npy", mmap_mode="r")
+        self.chunks = [
+            Chunk(*row) for row in json.loads((self.directory / "chunks.json").read_text())
+        ]
+
+        self.centroids: np.ndarray | None = None
+        self.list_offsets: np.ndarray | None = None
+        if self.n_lists:
+            self.centroids = np.load(self.directory / "centroids.npy")
+            self.list_offsets = np.load(self.directory / "list_offsets.npy")
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / "manifest.json").exists()
+
+    @classmethod
+    def write(
+        cls,
+        directory: Path,
+        chunks: list[Chunk],
+        embeddings: Sequence[Sequence[float]] | np.ndarray,
+        dim: int,
+        version: str | None = None,
+        embeddings_endpoint: str | None = None,
+        n_lists: int = 0,
+        centroids: np.ndarray | None = None,
+        trained_size: int | None = None,
+        n_iter: int = 10,
+        seed: int = 0,
+    ) -> LocalVectorIndex:
+        """Writes the index files. With n_lists > 0 the rows are partitioned into IVF lists,
+        using the given centroids or training new ones if there are none.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        embeddings = _normalize(embeddings, dim)
+
+        use_ivf = n_lists > 0 and len(chunks) >= n_lists
+        if use_ivf:
+            if centroids is None:
+                centroids = _kmeans(embeddings, n_lists, n_iter, seed)
+                trained_size = len(chunks)
+            assignments = _assign(embeddings, centroids)
+            order = np.argsort(assignments, kind="stable")
+            embeddings = embeddings[order]
+            chunks = [chunks[i] for i in order]
+            list_offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+            _save(directory / "centroids.npy", lambda path: np.save(path, centroids))
+            _save(directory / "list_offsets.npy", lambda path: np.save(path, list_offsets))
+
+        _save(directory / "embeddings.npy", lambda path: np.save(path, embeddings))
+        _save(
+            directory / "chunks.json",
+            lambda path: path.write_text(
+                json.dumps([[c.chunk_uuid, c.path, c.chunk_text] for c in chunks])
+            ),
+        )
+        # manifest goes last, it's what makes the new version visible
+        manifest = {
+            "dim": dim,
+            "version": version,
+            "embeddings_endpoint": embeddings_endpoint,
+            "n_lists": n_lists if use_ivf else 0,
+            "trained_size": (trained_size or len(chunks)) if use_ivf else 0,
+        }
+        _save(directory / "manifest.json", lambda path: path.write_text(json.dumps(manifest)))
+        return cls(directory)
+
+    def updated(
+        self,
+        added_chunks: list[Chunk],
+        added_embeddings: Sequence[Sequence[float]] | np.ndarray,
+        deleted_ids: set[str],
+        version: str | None,
+        n_lists: int = 0,
+    ) -> LocalVectorIndex:
+        """Writes a new version of the index with the chunks added and deleted.
+
+        The IVF centroids are reused while the corpus is less than twice the size they were trained on,
+        so small refreshes don't pay for the k-means training.
+        """
+        keep = np.array([chunk.chunk_uuid not in deleted_ids for chunk in self.chunks], dtype=bool)
+        chunks = [chunk for chunk, kept in zip(self.chunks, keep) if kept] + list(added_chunks)
+        embeddings = np.concatenate(
+            [self.embeddings[keep], _normalize(added_embeddings, self.dim)]
+        )
+
+        reuse_centroids = (
+            self.centroids is not None
+            and len(self.centroids) == n_lists
+            and len(chunks) < 2 * self.trained_size
+        )
+        return self.write(
+            self.directory,
+            chunks,
+            embeddings,
+            dim=self.dim,
+            version=version,
+            embeddings_endpoint=self.embeddings_endpoint,
+            n_lists=n_lists,
+            centroids=self.centroids if reuse_centroids else None,
+            trained_size=self.trained_size if reuse_centroids else None,
+        )
+
+    def _row_ranges(self, queries: np.ndarray, n_probe: int) -> list[tuple[int, int]]:
+        """Row ranges to scan for the batch: all the rows, or the union of the lists probed by the queries."""
+        if self.centroids is None:
+            return [(0, len(self.chunks))]
+
+        probed_lists, _ = _top_k(queries @ self.centroids.T, n_probe)
+        ranges = []
+        for list_id in np.unique(probed_lists):
+            start, end = int(self.list_offsets[list_id]), int(self.list_offsets[list_id + 1])
+            if start == end:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)  # adjacent lists are scanned as one range
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def search(
+        self, queries: Sequence[Sequence[float]] | np.ndarray, k: int = 3, n_probe: int = 8
+    ) -> list[list[SearchResult]]:
+        """Top-k chunks for each query in the batch, best first."""
+        queries = _normalize(queries, self.dim)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start, end in self._row_ranges(queries, n_probe):
+            for block_start in range(start, end, BLOCK_ROWS):
+                block = self.embeddings[block_start : min(block_start + BLOCK_ROWS, end)]
+                rows, scores = _top_k(queries @ block.T, k)
+                best_rows = np.concatenate([best_rows, rows + block_start], axis=1)
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                selected, best_scores = _top_k(best_scores, k)
+                best_rows = np.take_along_axis(best_rows, selected, axis=1)
+
+        return [
+            [SearchResult(self.chunks[row], float(score)) for row, score in zip(rows, scores)]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+
+def resolve_index_path(path: str | Path) -> Path:
+    """Relative paths point to an index shipped with the model, which sits next to this package in code_paths."""
+    path = Path(path)
+    if path.is_absolute():
+        return path
+    return Path(__file__).parent.parent / path
+
+
+class RetrieverInput(BaseModel):
+    query: str
+
+
+class LocalRetrieverTool(BaseTool):
+    """Retriever tool over the local index, with the same output as SerializedVectorSearchRetrieverTool."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str = "retriever"
+    description: str
+    args_schema: type[BaseModel] = RetrieverInput
+
+    index: LocalVectorIndex
+    embed_query: Callable[[str], list[float]]
+    num_results: int = 3
+    n_probe: int = 8
+
+    def _run(self, query: str) -> str:
+        [results] = self.index.search(
+            self.embed_query(query), k=self.num_results, n_probe=self.n_probe
+        )
+        documents = [
+            Document(page_content=result.chunk.chunk_text, metadata={"path": result.chunk.path})
+            for result in results
+        ]
+        return json.dumps([doc.model_dump() for doc in documents])
@@ -0,0 +1,113 @@
+import json
+import time
+from io import BytesIO
+
+from databricks.sdk import WorkspaceClient
+from databricks.sdk.errors import NotFound
+from loguru import logger
+from pyspark.sql import SparkSession
+
+from chatten_rag.common import Task
+from chatten_rag.tasks.driver import Driver, DriverConfig
+from chatten_rag.tasks.indexer import Indexer, IndexerConfig
+from chatten_rag.tasks.loader import Loader
+
+
+class PipelineConfig(IndexerConfig, DriverConfig):
+
+    # run all the stages, even if their inputs didn't change since the last run
+    force: bool = False
+
+
+class Pipeline:
+    """Runs the Task chain in one process, sharing the Spark session, the workspace client and the config.
+
+    Each stage fingerprints its inputs (see Task.fingerprint) and is skipped if they didn't change
+    since its last successful run and its outputs are still there (see Task.outputs_exist).
+    Fingerprints and stage timings are kept in a JSON file in the Volume.
+    """
+
+    stages: list[type[Task]] = [Loader, Indexer, Driver]
+
+    def __init__(self):
+        self.config = PipelineConfig()
+        self.spark = SparkSession.builder.getOrCreate()
+        self.client = WorkspaceClient(profile=self.config.profile)
+
+    def load_state(self) -> dict:
+        path = self.config.full_pipeline_state_path.as_posix()
+        try:
+            return json.loads(self.client.files.download(path).contents.read())
+        except NotFound:
+            logger.info(f"No pipeline state found at {path}, all the stages will run")
+            return {}
+
+    def save_state(self, state: dict) -> None:
+        self.client.files.upload(
+            self.config.full_pipeline_state_path.as_posix(),
+            BytesIO(json.dumps(state, indent=4).encode()),
+            overwrite=True,
+        )
+
+    def run(self):
+        tasks = [
+            stage(spark=self.spark, client=self.client, config=self.config)
+            for stage in self.stages
+        ]
+        # catalog, database and volume are the same for all the tasks, so they're prepared once
+        tasks[0].setup()
+
+        state = self.load_state()
+        stages_state = state.setdefault("stages", {})
+        timings = {}
+        started = time.perf_counter()
+
+        for task in tasks:
+            name = type(task).__name__
+            stage_started = time.perf_counter()
+
+            fingerprint = task.fingerprint()
+            previous = stages_state.get(name, {}).get("fingerprint")
+            unchanged = fingerprint is not None and fingerprint == previous
+            if unchanged and not task.outputs_exist():
+                logger.info(f"{name} inputs didn't change, but its outputs are missing")
+                unchanged = False
+
+            if not self.config.force and unchanged:
+                logger.info(f"Skipping {name}, its inputs didn't change since the last run")
+                status = "skipped"
+            else:
+                logger.info(f"Running {name}")
+                task.run()
+                status = "ran"
+                # the task may have changed its own inputs (e.g. the raw files downloaded by the loader),
+                # so the fingerprint is taken again for the next run to compare against
+                stages_state[name] = {
+                    "fingerprint": task.fingerprint(),
+                    "finished_at": time.time(),
+                }
+
+            timings[name] = {
+                "status": status,
+                "seconds": round(time.perf_counter() - stage_started, 2),
+            }
+            logger.info(f"{name} {status} in {timings[name]['seconds']}s")
+            # saved after each stage, so a failure doesn't rerun the stages that already finished
+            state["last_run"] = {"finished_at": None, "stages": timings}
+            self.save_state(state)
+
+        state["last_run"]["finished_at"] = time.time()
+        state["last_run"]["seconds"] = round(time.perf_counter() - started, 2)
+        self.save_state(state)
+
+        logger.info("Pipeline summary:")
+        for name, timing in timings.items():
+            logger.info(f"{name:>8}: {timing['status']:>7} in {timing['seconds']}s")
+
+    @classmethod
+    def entrypoint(cls):
+        logger.info("Running the pipeline")
+        pipeline = cls()
+        logger.info(f"Config: {pipeline.config.model_dump_json(indent=4)}")
+        pipeline.run()
+        logger.info("Finished running the pipeline")
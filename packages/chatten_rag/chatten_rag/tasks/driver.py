@@ -1,9 +1,16 @@
 from pathlib import Path, PosixPath
+import shutil
 import tempfile
+import time
 from typing import Any
-from chatten_rag.common import Task
+from chatten_rag.common import Task, fingerprint_of
 import mlflow
+from mlflow import MlflowClient
+from mlflow.exceptions import MlflowException
+import numpy as np
 from mlflow.models.resources import (
+    DatabricksResource,
+    DatabricksServingEndpoint,
     DatabricksVectorSearchIndex,
 )
 from mlflow.models.model import ModelInfo
@@ -11,11 +18,15 @@ import yaml
 
 from chatten.config import Config
 from databricks import agents
-from databricks.sdk import WorkspaceClient
+from databricks.sdk.errors import NotFound
 
 
 def log_agent(
-    agent_path: str, model_config_path: str, input_example: dict[str, Any], vsi: str
+    agent_path: str,
+    model_config_path: str,
+    input_example: dict[str, Any],
+    resources: list[DatabricksResource],
+    code_paths: list[str] | None = None,
 ) -> ModelInfo:
     return mlflow.langchain.log_model(
         lc_model=agent_path,
@@ -24,30 +35,186 @@ def log_agent(
             "databricks-langchain",
             "langgraph",
             "langchain-core",
+            "numpy",
             "pydantic",
             "loguru",
         ],
         artifact_path="agent",
         input_example=input_example,
-        resources=[
-            DatabricksVectorSearchIndex(
-                index_name=vsi,
-            ),
-        ],
+        resources=resources,
+        code_paths=code_paths,
     )
 
 
-class Driver(Task[Config]):
-    config_class = Config
+class DriverConfig(Config):
+
+    # prompts replayed against the logged agent before it gets registered
+    eval_prompts: list[str] = [
+        "What is Unity Catalog?",
+        "How do I create a Delta Live Tables pipeline?",
+        "What is the difference between a job cluster and an all-purpose cluster?",
+        "How can I share data with Delta Sharing?",
+        "What is Databricks Model Serving?",
+    ]
+
+    # each prompt is replayed this many times, so the latency percentiles are computed on enough samples
+    eval_repeats: int = 4
+
+    # latency is only gated when both versions were evaluated on at least this many samples,
+    # with fewer samples p95 is just the slowest call
+    eval_min_samples: int = 20
+
+    # allowed relative increase of the evaluation metrics against the previous registered version,
+    # e.g. 0.2 means that the new version can be at most 20% slower than the previous one
+    max_latency_regression: float = 0.2
+    max_tokens_regression: float = 0.5
+
+    # latency increases below this absolute amount are never a regression,
+    # remote LLM latency is too noisy to gate on small differences
+    latency_regression_slack_seconds: float = 0.5
+
+
+def _response_tokens(response: Any) -> int | None:
+    """Total tokens of the LLM calls made by the agent, from the usage block. None if not reported."""
+    usage = response.get("usage") or {}
+    return usage.get("total_tokens")
+
+
+class Driver(Task[DriverConfig]):
+    config_class = DriverConfig
 
     INPUT_EXAMPLE = {
         "messages": [{"role": "user", "content": "What is Unity Catalog?"}]
     }
 
+    def fingerprint(self) -> str:
+        """Agent code, model config and the local index version (if used), i.e. everything the logged agent consists of."""
+        package_path = Path(__file__).parent.parent
+        sources = [package_path / "agent.py", Path(__file__)]
+        local_index_manifest = None
+        if self.config.retriever == "local":
+            sources.append(package_path / "local_index.py")
+            manifest_path = self.config.full_local_index_path / "manifest.json"
+            if manifest_path.exists():
+                local_index_manifest = manifest_path.read_text()
+
+        return fingerprint_of(
+            [source.read_text() for source in sources],
+            self.config.as_model_config,
+            local_index_manifest,
+        )
+
+    def outputs_exist(self) -> bool:
+        """The serving endpoint exists and the model version it serves is still registered."""
+        try:
+            endpoint = self.client.serving_endpoints.get(self.config.agent_serving_endpoint_name)
+        except NotFound:
+            return False
+
+        endpoint_config = endpoint.config or endpoint.pending_config
+        served_entities = (endpoint_config.served_entities if endpoint_config else None) or []
+        for entity in served_entities:
+            try:
+                self.client.model_versions.get(entity.entity_name, int(entity.entity_version))
+                return True
+            except NotFound:
+                continue
+        return False
+
+    def evaluate(self, model_uri: str) -> dict[str, float]:
+        """Load the logged agent locally and replay the evaluation prompts against it.
+
+        Returns latency percentiles (in seconds) and token usage, ready to be logged as MLflow metrics.
+        """
+        self.logger.info(f"Loading the logged agent from {model_uri} for evaluation")
+        model = mlflow.pyfunc.load_model(model_uri)
+
+        # the first call initializes the clients and the model, it's not part of the measurements
+        model.predict(self.INPUT_EXAMPLE)
+
+        latencies, tokens = [], []
+        for _ in range(self.config.eval_repeats):
+            for prompt in self.config.eval_prompts:
+                payload = {"messages": [{"role": "user", "content": prompt}]}
+                start = time.perf_counter()
+                response = model.predict(payload)
+                latencies.append(time.perf_counter() - start)
+
+                if isinstance(response, list):
+                    response = response[0]
+                if (response_tokens := _response_tokens(response)) is not None:
+                    tokens.append(response_tokens)
+
+        metrics = {
+            "eval_samples": float(len(latencies)),
+            "eval_latency_p50": float(np.percentile(latencies, 50)),
+            "eval_latency_p95": float(np.percentile(latencies, 95)),
+        }
+        if tokens:
+            # named after the usage block, the earlier versions logged a word count of the response instead
+            metrics["eval_usage_tokens_mean"] = float(np.mean(tokens))
+            metrics["eval_usage_tokens_total"] = float(np.sum(tokens))
+        else:
+            self.logger.warning("The agent didn't report token usage, tokens won't be gated")
+        return metrics
+
+    def previous_metrics(self) -> dict[str, float] | None:
+        """Evaluation metrics of the latest registered version of the agent, if there is one."""
+        client = MlflowClient()
+        try:
+            versions = client.search_model_versions(
+                f"name='{self.config.agent_serving_endpoint_with_catalog}'"
+            )
+        except MlflowException as e:
+            self.logger.info(f"No previous registered versions found: {e}")
+            return None
+
+        if not versions:
+            return None
+
+        latest = max(versions, key=lambda version: int(version.version))
+        self.logger.info(f"Comparing against registered version {latest.version}")
+        return client.get_run(latest.run_id).data.metrics
+
+    def check_regression(
+        self, current: dict[str, float], previous: dict[str, float] | None
+    ) -> list[str]:
+        """Returns the list of violated thresholds, empty if the new version is good to go."""
+        if not previous:
+            return []
+
+        enough_samples = min(
+            current.get("eval_samples", 0), previous.get("eval_samples", 0)
+        ) >= self.config.eval_min_samples
+        if not enough_samples:
+            self.logger.warning(
+                f"Latency is not gated, less than {self.config.eval_min_samples} evaluation samples"
+            )
+
+        # metric -> (allowed relative increase, absolute increase always allowed)
+        thresholds = {"eval_usage_tokens_mean": (self.config.max_tokens_regression, 0.0)}
+        if enough_samples:
+            slack = self.config.latency_regression_slack_seconds
+            thresholds["eval_latency_p50"] = (self.config.max_latency_regression, slack)
+            thresholds["eval_latency_p95"] = (self.config.max_latency_regression, slack)
+
+        violations = []
+        for metric, (threshold, slack) in thresholds.items():
+            if not previous.get(metric) or metric not in current:
+                # previous version was logged before the metric was introduced, or the metric is not reported
+                continue
+            ratio = current[metric] / previous[metric]
+            if ratio > 1 + threshold and current[metric] - previous[metric] > slack:
+                violations.append(
+                    f"{metric}: {current[metric]:.3f} vs {previous[metric]:.3f} "
+                    f"(+{(ratio - 1):.0%}, allowed +{threshold:.0%})"
+                )
+        return violations
+
     def run(self):
         self.logger.info("Setting up the MLflow experiment")
 
-        username = WorkspaceClient().current_user.me().user_name
+        username = self.client.current_user.me().user_name
         experiment_path = f"/Users/{username}/chatten"
         experiment = mlflow.set_experiment(experiment_path)
 
@@ -68,9 +235,32 @@ class Driver(Task[Config]):
             )
 
             dest_agent_path.write_text(src_agent_path.read_text())
+
+            model_config = self.config.as_model_config
+            if self.config.retriever == "local":
+                # the serving endpoint can't read the index from the Volume,
+                # so it's shipped with the model, next to the chatten_rag package
+                shipped_index_path = _temp_dir_path / self.config.local_index_path.name
+                shutil.copytree(self.config.full_local_index_path, shipped_index_path)
+                model_config["local_index_path"] = shipped_index_path.name
+                code_paths = [
+                    src_agent_path.parent.as_posix(),
+                    shipped_index_path.as_posix(),
+                ]
+                resources = [
+                    DatabricksServingEndpoint(
+                        endpoint_name=self.config.embeddings_endpoint
+                    )
+                ]
+            else:
+                code_paths = None
+                resources = [
+                    DatabricksVectorSearchIndex(index_name=self.config.vsi_with_catalog)
+                ]
+
             config_path.write_text(
                 yaml.dump(
-                    self.config.as_model_config,
+                    model_config,
                     indent=4,
                 )
             )
@@ -84,14 +274,30 @@ class Driver(Task[Config]):
                     agent_path=dest_agent_path.as_posix(),
                     model_config_path=config_path.as_posix(),
                     input_example=self.INPUT_EXAMPLE,
-                    vsi=self.config.vsi_with_catalog,
+                    resources=resources,
+                    code_paths=code_paths,
                 )
 
+                self.logger.info(
+                    f"Evaluating the agent on {len(self.config.eval_prompts)} prompts, "
+                    f"{self.config.eval_repeats} times each"
+                )
+                metrics = self.evaluate(logged_agent_info.model_uri)
+                mlflow.log_metrics(metrics)
+                self.logger.info(f"Evaluation metrics: {metrics}")
+
         self.logger.info(f"Model logged to MLflow: {logged_agent_info}")
 
         # Register the model with the UC registry
         mlflow.set_registry_uri("databricks-uc")
 
+        violations = self.check_regression(metrics, self.previous_metrics())
+        if violations:
+            raise RuntimeError(
+                "Agent performance regressed against the previous registered version, "
+                f"refusing to deploy: {'; '.join(violations)}"
+            )
+
         self.logger.info(
             f"Registering the model with the UC registry: {self.config.agent_serving_endpoint_with_catalog}"
         )
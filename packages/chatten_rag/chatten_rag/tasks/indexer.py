@@ -1,5 +1,8 @@
-from chatten_rag.common import Task
+from pathlib import Path
+from chatten_rag.common import Task, fingerprint_of
+from chatten_rag.local_index import Chunk, LocalVectorIndex
 from chatten.config import Config
+from databricks.sdk.errors import NotFound
 from databricks.vector_search.client import VectorSearchClient
 from tenacity import RetryCallState, retry, wait_exponential_jitter, stop_after_attempt
 
@@ -9,14 +12,153 @@ class IndexerConfig(Config):
     # vector search index
     vsi_endpoint: str
 
-    # embedding model endpoint
-    embeddings_endpoint: str = "databricks-gte-large-en"
+    # batch size of the embedding requests when refreshing the local index
+    local_index_embedding_batch_size: int = 64
 
 
 class Indexer(Task[IndexerConfig]):
     config_class = IndexerConfig
 
+    def fingerprint(self) -> str:
+        """Docs table version and the index settings."""
+        return fingerprint_of(
+            self.docs_table_version(),
+            self.config.retriever,
+            self.config.vsi_with_catalog,
+            self.config.vsi_endpoint,
+            self.config.embeddings_endpoint,
+            self.config.full_local_index_path,
+            self.config.local_index_ivf_lists,
+        )
+
+    def outputs_exist(self) -> bool:
+        if self.config.retriever == "local":
+            return LocalVectorIndex.exists(Path(self.config.full_local_index_path))
+        try:
+            self.client.vector_search_indexes.get_index(self.config.vsi_with_catalog)
+            return True
+        except NotFound:
+            return False
+
     def run(self):
+        if self.config.retriever == "local":
+            self.refresh_local_index()
+        else:
+            self.sync_vector_search_index()
+
+    def refresh_local_index(self):
+        """Brings the local index up to date with the docs table.
+
+        Only the chunks that are not in the index yet are embedded, the deleted chunks are dropped.
+        The index is rebuilt from scratch if it was embedded with another endpoint or with vectors
+        of another dimension, since the vectors of two models can't be compared.
+        """
+        directory = Path(self.config.full_local_index_path)
+        table = self.config.docs_with_catalog
+        endpoint = self.config.embeddings_endpoint
+        version = self.docs_table_version()
+
+        index = LocalVectorIndex(directory) if LocalVectorIndex.exists(directory) else None
+        if index is not None and index.embeddings_endpoint != endpoint:
+            self.logger.info(
+                f"Local index at {directory} was embedded with {index.embeddings_endpoint}, rebuilding it with {endpoint}"
+            )
+            index = None
+
+        if (
+            index is not None
+            and index.version == version
+            and index.n_lists == self.config.local_index_ivf_lists
+        ):
+            self.logger.info(f"Local index at {directory} is up to date with {table} ({version})")
+            return
+
+        docs = self.spark.table(table).select("chunk_uuid", "path", "chunk_text")
+        known_ids = {chunk.chunk_uuid for chunk in index.chunks} if index else set()
+        current_ids = {row.chunk_uuid for row in docs.select("chunk_uuid").toLocalIterator()}
+        deleted_ids = known_ids - current_ids
+
+        new_docs = docs
+        if known_ids:
+            known = self.spark.createDataFrame(
+                [(chunk_uuid,) for chunk_uuid in known_ids], "chunk_uuid string"
+            )
+            new_docs = docs.join(known, "chunk_uuid", "left_anti")
+        added = [
+            Chunk(row.chunk_uuid, row.path, row.chunk_text)
+            for row in new_docs.toLocalIterator()
+        ]
+        self.logger.info(
+            f"Refreshing the local index from {table} ({version}): "
+            f"{len(added)} new chunks, {len(deleted_ids)} deleted chunks"
+        )
+        vectors = self.embed_chunks(added)
+
+        if index is not None and vectors and len(vectors[0]) != index.dim:
+            # same endpoint name, but it serves another model now
+            self.logger.info(
+                f"{endpoint} returned vectors of dimension {len(vectors[0])} instead of {index.dim}, "
+                f"rebuilding the local index at {directory}"
+            )
+            index = None
+            added = [
+                Chunk(row.chunk_uuid, row.path, row.chunk_text)
+                for row in docs.toLocalIterator()
+            ]
+            vectors = self.embed_chunks(added)
+
+        if index is None:
+            if not vectors:
+                self.logger.info(f"No chunks in {table}, local index is not created")
+                return
+            index = LocalVectorIndex.write(
+                directory,
+                added,
+                vectors,
+                dim=len(vectors[0]),
+                version=version,
+                embeddings_endpoint=endpoint,
+                n_lists=self.config.local_index_ivf_lists,
+            )
+        else:
+            index = index.updated(
+                added,
+                vectors,
+                deleted_ids,
+                version=version,
+                n_lists=self.config.local_index_ivf_lists,
+            )
+
+        self.logger.info(f"Local index at {directory} refreshed, {len(index)} chunks")
+
+    def embed_chunks(self, chunks: list[Chunk]) -> list[list[float]]:
+        from databricks_langchain import DatabricksEmbeddings
+
+        embeddings = DatabricksEmbeddings(endpoint=self.config.embeddings_endpoint)
+        max_attempts = 5
+
+        def log_retry(retry_state: RetryCallState):
+            self.logger.info(
+                f"Retrying... attempt {retry_state.attempt_number}/{max_attempts}"
+            )
+
+        @retry(
+            wait=wait_exponential_jitter(initial=0.5, max=60),
+            stop=stop_after_attempt(max_attempts),
+            before_sleep=log_retry,
+            reraise=True,
+        )
+        def embed_with_retries(texts: list[str]) -> list[list[float]]:
+            return embeddings.embed_documents(texts)
+
+        batch_size = self.config.local_index_embedding_batch_size
+        vectors = []
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start : start + batch_size]
+            vectors.extend(embed_with_retries([chunk.chunk_text for chunk in batch]))
+        return vectors
+
+    def sync_vector_search_index(self):
 
         client = VectorSearchClient(disable_notice=True)
 
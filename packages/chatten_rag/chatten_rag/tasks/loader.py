@@ -3,8 +3,9 @@ from functools import partial
 from pathlib import PosixPath
 import requests
 from chatten.config import Config
-from chatten_rag.common import Task
+from chatten_rag.common import Task, fingerprint_of
 from concurrent.futures import ThreadPoolExecutor
+from databricks.sdk.errors import NotFound
 import io
 from pypdf import PdfReader
 from pyspark.sql.functions import pandas_udf, col, explode, expr
@@ -42,6 +43,26 @@ def split_text(text: pd.Series) -> pd.Series:
 class Loader(Task[Config]):
     config_class = Config
 
+    # owner, repo and path of the source documents on GitHub
+    DOCS_SOURCE = ("databricks-demos", "dbdemos-dataset", "/llm/databricks-pdf-documentation")
+
+    def fingerprint(self) -> str:
+        """Source files on GitHub, raw files in the Volume and the docs table state."""
+        remote = sorted(
+            (f["name"], f["sha"]) for f in self.list_files_in_git(*self.DOCS_SOURCE)
+        )
+        try:
+            local = sorted(
+                (entry.name, entry.file_size, entry.last_modified)
+                for entry in self.client.files.list_directory_contents(
+                    self.config.full_raw_docs_path.as_posix()
+                )
+                if not entry.is_directory
+            )
+        except NotFound:
+            local = []
+        return fingerprint_of(remote, local, self.docs_table_version())
+
     def _download_file(self, url: str, destination: PosixPath) -> PosixPath:
         filename = PosixPath(url.split("/")[-1])
         local_filename = destination / filename
@@ -61,15 +82,24 @@ class Loader(Task[Config]):
                     f.write(chunk)
         return local_filename
 
+    def outputs_exist(self) -> bool:
+        return self.spark.catalog.tableExists(self.config.docs_with_catalog)
+
+    def list_files_in_git(self, owner, repo, path) -> list[dict]:
+        response = requests.get(
+            f"https://api.github.com/repos/{owner}/{repo}/contents{path}"
+        )
+        # e.g. a rate limit error, its body is not a listing of the files
+        response.raise_for_status()
+        files = response.json()
+        return [f for f in files if "NOTICE" not in f["name"]]
+
     def download_file_from_git(self, dest: PosixPath, owner, repo, path):
 
         if not dest.exists():
             dest.mkdir(parents=True)
 
-        files = requests.get(
-            f"https://api.github.com/repos/{owner}/{repo}/contents{path}"
-        ).json()
-        files = [f["download_url"] for f in files if "NOTICE" not in f["name"]]
+        files = [f["download_url"] for f in self.list_files_in_git(owner, repo, path)]
         files = [
             f.replace(
                 "https://raw.githubusercontent.com/databricks-demos/dbdemos-dataset/main/",
@@ -126,12 +156,7 @@ class Loader(Task[Config]):
         self.logger.info(
             f"Downloading files from git into {self.config.full_raw_docs_path}"
         )
-        self.download_file_from_git(
-            self.config.full_raw_docs_path,
-            "databricks-demos",
-            "dbdemos-dataset",
-            "/llm/databricks-pdf-documentation",
-        )
+        self.download_file_from_git(self.config.full_raw_docs_path, *self.DOCS_SOURCE)
         self.logger.info("Finished downloading files")
 
         self.process_files_into_table()
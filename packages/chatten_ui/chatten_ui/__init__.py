@@ -46,7 +46,13 @@ _js_dist.extend(
     ]
 )
 
-_css_dist = []
+_css_dist = [
+    {
+        # compiled and purged by the Tailwind CLI during the build, see package.json
+        'relative_package_path': 'chatten_ui.css',
+        'namespace': package_name
+    }
+]
 
 
 for _component in __all__:
@@ -1,11 +1,20 @@
 from hatchling.builders.hooks.plugin.interface import BuildHookInterface
 from pathlib import Path
+import json
 import subprocess
 
 class DashBuildHook(BuildHookInterface):
     def initialize(self, _, __):
         self.app.display_info(f"Running dash build hook for project {self.metadata.name} in directory {Path.cwd()}")
-        
+
+        # the stylesheet is compiled by the Tailwind CLI, which locked installs (npm ci) only provide
+        # once package-lock.json has been refreshed with npm install
+        lockfile = json.loads((Path.cwd() / "package-lock.json").read_text())
+        if "node_modules/tailwindcss" not in lockfile.get("packages", {}):
+            raise RuntimeError(
+                "tailwindcss is missing from package-lock.json, run npm install in packages/chatten_ui and commit the lockfile"
+            )
+
         process = subprocess.Popen(
             ['npm', 'run', 'build'],
             stdout=subprocess.PIPE,
@@ -21,3 +30,13 @@ class DashBuildHook(BuildHookInterface):
 
         process.wait()
 
+        if process.returncode != 0:
+            raise RuntimeError(f"npm build failed with exit code {process.returncode}")
+
+        # the stylesheet is shipped with the package instead of compiling Tailwind in the browser
+        css_bundle = Path.cwd() / "chatten_ui" / "chatten_ui.css"
+        if not css_bundle.exists():
+            raise RuntimeError(f"CSS bundle {css_bundle} was not produced by the build")
+
+        self.app.display_info(f"CSS bundle size: {css_bundle.stat().st_size / 1024:.1f} KiB")
+
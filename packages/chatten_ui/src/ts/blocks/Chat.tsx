@@ -28,12 +28,21 @@ interface CurrentFileMeta {
   fileName: string;
   initialPageNumber: number;
   textToHighlight: string;
+  // page number in the original file, and the range of the original pages that is loaded
+  pageNum: number;
+  firstPage: number;
+  lastPage: number;
+  numPages: number;
+  isSlice: boolean;
 }
 
 const ChatUI = () => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputMessage, setInputMessage] = useState("");
 
+  // server-side conversation session, assigned by the API on the first message
+  const [sessionId, setSessionId] = useState<string | undefined>(undefined);
+
   // probably bad name choice. isLoading is used to show a loading spinner when bot is typing
   // loadingFile is used to show a loading spinner when a file is being loaded
   const [isLoading, setIsLoading] = useState(false);
@@ -78,10 +87,20 @@ const ChatUI = () => {
       setInputMessage("");
 
       try {
-        const data = await api.chat.send(message);
+        const data = await api.chat.send(message, sessionId);
+        setSessionId(data.session_id);
 
-        setMessages(prevMessages => [...prevMessages, { content: data.content, sender: "bot", metadata: data.metadata }]);
+        const botMessage: Message = { content: data.content, sender: "bot", metadata: data.metadata };
+        setMessages(prevMessages => [...prevMessages, botMessage]);
         setIsLoading(false);
+
+        // fetch the relevant pages of all sources in one request, unless the server already provided them
+        if (data.metadata?.some((meta) => meta.page_num == null)) {
+          api.getRelevantPages(data.metadata).then((pages) => {
+            const metadata = data.metadata.map((meta, i) => ({ ...meta, page_num: pages[i].page_num ?? undefined }));
+            setMessages(prevMessages => prevMessages.map((msg) => msg === botMessage ? { ...msg, metadata } : msg));
+          }).catch((error) => console.warn('Could not prefetch relevant pages: ', error));
+        }
       } catch (error) {
 
         setMessages((prevMessages) => [
@@ -105,32 +124,61 @@ const ChatUI = () => {
     });
   };
 
-  const loadFile = async (fileName: string, query: string) => {
+  const loadFile = async (fileName: string, query: string, pageNum?: number) => {
     setLoadingFile(true);
     try {
-      const content = await api.getFile(fileName);
-      const initialPageIndex = await api.getRelevantPageIndex(fileName, query);
+      // only the slice around the relevant page is loaded, the full file is loaded on demand
+      const relevantPage = pageNum ?? await api.getRelevantPageIndex(fileName, query);
+      const slice = await api.getFileSlice(fileName, relevantPage);
       setCurrentFileMeta({
         fileName,
-        initialPageNumber: initialPageIndex,
+        initialPageNumber: relevantPage - slice.firstPage + 1,
         textToHighlight: query,
+        pageNum: relevantPage,
+        firstPage: slice.firstPage,
+        lastPage: slice.lastPage,
+        numPages: slice.numPages,
+        isSlice: true,
+      });
+      setPdfContent(slice.content);
+    } catch (error) {
+      handleFileError(error);
+    } finally {
+      setLoadingFile(false);
+    }
+  };
+
+  const loadFullFile = async (fileMeta: CurrentFileMeta) => {
+    setLoadingFile(true);
+    try {
+      const content = await api.getFile(fileMeta.fileName);
+      setCurrentFileMeta({
+        ...fileMeta,
+        initialPageNumber: fileMeta.pageNum,
+        firstPage: 1,
+        lastPage: fileMeta.numPages,
+        isSlice: false,
       });
       setPdfContent(content);
     } catch (error) {
-      // add message to the chat
-      setMessages((prevMessages) => [
-        ...prevMessages,
-        {
-          content: `Sorry, I'm having trouble with downloading the file. Error details: ${error.message}`,
-          has_error: true,
-          sender: "bot",
-        },
-      ]);
+      handleFileError(error);
     } finally {
       setLoadingFile(false);
     }
   };
 
+  const handleFileError = (error) => {
+    // add message to the chat
+    setMessages((prevMessages) => [
+      ...prevMessages,
+      {
+        content: `Sorry, I'm having trouble with downloading the file. Error details: ${error.message}`,
+        has_error: true,
+        sender: "bot",
+      },
+    ]);
+  };
+
   const renderMessage = (message: Message, index) => {
     return (
       <div
@@ -168,7 +216,7 @@ const ChatUI = () => {
                 // file will be loaded exactly on the page where the query is found
                 <button
                   key={i}
-                  onClick={() => loadFile(meta.file_name, meta.content)}
+                  onClick={() => loadFile(meta.file_name, meta.content, meta.page_num)}
                   className="bg-white p-2 rounded-lg shadow-md mt-2 text-left max-w-3/4 w-full hover:bg-gray-100 transition-colors duration-200"
                 >
                   <div className="flex justify-between items-center">
@@ -263,7 +311,20 @@ const ChatUI = () => {
               <div className="flex justify-between items-center mb-4">
                 <div className="text-lg font-semibold text-gray-800">
                   📄 Preview {currentFileMeta.fileName.replace(".pdf", "")}
+                  {currentFileMeta.isSlice && (
+                    <span className="ml-2 text-sm font-normal text-gray-500">
+                      pages {currentFileMeta.firstPage}-{currentFileMeta.lastPage} of {currentFileMeta.numPages}
+                    </span>
+                  )}
                 </div>
+                {currentFileMeta.isSlice && (
+                  <button
+                    onClick={() => loadFullFile(currentFileMeta)}
+                    className="ml-auto mr-4 text-sm text-blue-600 hover:text-blue-800"
+                  >
+                    Show full document
+                  </button>
+                )}
                 <button
                   onClick={() => setPdfContent(null)}
                   className="text-red-500 hover:text-red-700"
@@ -271,7 +332,7 @@ const ChatUI = () => {
                   <CircleX className="w-6 h-6" />
                 </button>
               </div>
-              <PdfViewer memoizedPdfPointer={memoizedPdfPointer} initialPageNumber={currentFileMeta.initialPageNumber} textToHighlight={currentFileMeta.textToHighlight} />
+              <PdfViewer key={`${currentFileMeta.fileName}-${currentFileMeta.firstPage}-${currentFileMeta.lastPage}`} memoizedPdfPointer={memoizedPdfPointer} initialPageNumber={currentFileMeta.initialPageNumber} textToHighlight={currentFileMeta.textToHighlight} />
             </Modal>
           )}
         </div>
@@ -1,5 +1,5 @@
 import axios from "axios";
-import { Message } from "./types";
+import { ChatReply, Metadata, RelevantPage } from "./types";
 
 const apiClient = axios.create({
     baseURL: "/api",
@@ -7,12 +7,12 @@ const apiClient = axios.create({
 
 export const api = {
     chat: {
-        send: async (message: string) => {
-            const { data, status } = await apiClient.post("/chat", { message });
+        send: async (message: string, session_id?: string) => {
+            const { data, status } = await apiClient.post("/chat", { message, session_id });
             if (status !== 200) {
                 throw new Error(data.content)
             }
-            return data as Message;
+            return data as ChatReply;
         },
     },
     getFile: async (file_name: string) => {
@@ -30,6 +30,27 @@ export const api = {
         return binary;
     },
 
+    getFileSlice: async (file_name: string, page_num: number) => {
+        // only the relevant page (and a few pages around it) as a standalone PDF
+        const { data, status, headers } = await apiClient.get(`/files/slice`, {
+            params: {
+                file_name,
+                page_num,
+            },
+            responseType: "arraybuffer",
+        });
+
+        if (status !== 200) {
+            throw new Error(`HTTP error! status: ${status}`);
+        }
+        return {
+            content: new Uint8Array(data),
+            firstPage: Number(headers["x-chatten-first-page"]),
+            lastPage: Number(headers["x-chatten-last-page"]),
+            numPages: Number(headers["x-chatten-num-pages"]),
+        };
+    },
+
     getRelevantPageIndex: async (file_name: string, query: string) => {
         const { data, status } = await apiClient.post(`/files/relevant_page`, {
             file_name,
@@ -41,5 +62,17 @@ export const api = {
         }
 
         return data.page_num as number;
+    },
+
+    getRelevantPages: async (metadata: Metadata[]) => {
+        const { data, status } = await apiClient.post(`/files/relevant_pages`, {
+            items: metadata.map((meta) => ({ file_name: meta.file_name, query: meta.content })),
+        });
+
+        if (status !== 200) {
+            throw new Error(`HTTP error! status: ${status}`);
+        }
+
+        return data as RelevantPage[];
     }
 };
\ No newline at end of file
@@ -2,6 +2,7 @@ export interface Metadata {
   file_name: string;
   year?: number;
   content?: string;
+  page_num?: number;
 }
 
 export interface Message {
@@ -9,4 +10,18 @@ export interface Message {
   sender: "user" | "bot";
   metadata?: Metadata[];
   has_error?: boolean;
+}
+
+export interface ChatReply {
+  content: string;
+  metadata: Metadata[];
+  session_id: string;
+  estimated_prompt_tokens?: number;
+}
+
+export interface RelevantPage {
+  file_name: string;
+  query: string;
+  page_num?: number;
+  error?: string;
 }
\ No newline at end of file
@@ -0,0 +1,9 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+    // only the classes used in the components end up in the bundle
+    content: ['./src/ts/**/*.{ts,tsx}'],
+    theme: {
+        extend: {},
+    },
+    plugins: [],
+};
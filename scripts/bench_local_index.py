@@ -0,0 +1,83 @@
+"""Query latency of the local vector index against the corpus size.
+
+Builds indexes from random embeddings in a temporary directory (flat, and IVF-partitioned if --ivf-lists is set)
+and measures the latency of single queries and query batches. For IVF, the recall@k against the flat index
+is reported as well, since probing only some of the lists trades accuracy for speed.
+
+Usage:
+
+    python scripts/bench_local_index.py --sizes 10000 100000 500000 --dim 1024 --ivf-lists 256 --n-probe 8
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from chatten_rag.local_index import Chunk, LocalVectorIndex
+
+
+def measure(index: LocalVectorIndex, queries: np.ndarray, batch: int, k: int, n_probe: int) -> tuple[float, float]:
+    latencies = []
+    for start in range(0, len(queries), batch):
+        started = time.perf_counter()
+        index.search(queries[start : start + batch], k=k, n_probe=n_probe)
+        latencies.append(time.perf_counter() - started)
+    p = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return p[49], p[94]
+
+
+def recall(flat: LocalVectorIndex, ivf: LocalVectorIndex, queries: np.ndarray, k: int, n_probe: int) -> float:
+    expected = flat.search(queries, k=k)
+    actual = ivf.search(queries, k=k, n_probe=n_probe)
+    hits = [
+        len({r.chunk.chunk_uuid for r in e} & {r.chunk.chunk_uuid for r in a}) / k
+        for e, a in zip(expected, actual)
+    ]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1024, help="databricks-gte-large-en embeddings have 1024 dimensions")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--ivf-lists", type=int, default=0)
+    parser.add_argument("--n-probe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>9} {'index':>6} {'build s':>8} {'single p50 ms':>14} {'single p95 ms':>14} {'batch p50 ms':>13} {'recall':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+            chunks = [Chunk(str(i), f"doc_{i % 100}.pdf", "") for i in range(size)]
+            # queries close to the corpus vectors, like real questions are close to some chunks
+            queries = embeddings[rng.choice(size, args.queries)] + rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+            variants = [("flat", 0)] + ([("ivf", args.ivf_lists)] if args.ivf_lists else [])
+            indexes = {}
+            for name, n_lists in variants:
+                started = time.perf_counter()
+                indexes[name] = LocalVectorIndex.write(
+                    Path(tmp_dir) / f"{name}_{size}", chunks, embeddings, dim=args.dim, n_lists=n_lists
+                )
+                build_seconds = time.perf_counter() - started
+
+                single_p50, single_p95 = measure(indexes[name], queries, 1, args.k, args.n_probe)
+                batch_p50, _ = measure(indexes[name], queries, args.batch, args.k, args.n_probe)
+                index_recall = recall(indexes["flat"], indexes[name], queries, args.k, args.n_probe) if name == "ivf" else 1.0
+                print(
+                    f"{size:>9} {name:>6} {build_seconds:>8.1f} {single_p50 * 1000:>14.2f} "
+                    f"{single_p95 * 1000:>14.2f} {batch_p50 * 1000:>13.2f} {index_recall:>7.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Micro-benchmark of parsing the agent responses in the app.
+
+Compares the legacy format (all the agent messages serialized as a JSON string in the content,
+with the retriever results serialized once more inside the tool message) with the structured format
+(answer in the content, sources in the custom outputs). Both go through ChatResponse.from_json,
+the same way the /chat endpoint parses the raw response body.
+
+Usage:
+
+    python scripts/bench_parse.py --sources 3 --answer-words 200 --number 2000
+"""
+
+import argparse
+import json
+import timeit
+import uuid
+
+from chatten_app.models import ChatResponse
+
+
+def legacy_payload(question: str, answer: str, docs: list[dict]) -> bytes:
+    def message(message_type: str, content: str, **extra) -> dict:
+        return {
+            "content": content,
+            "additional_kwargs": {},
+            "response_metadata": {},
+            "type": message_type,
+            "name": None,
+            "id": str(uuid.uuid4()),
+            **extra,
+        }
+
+    tool_call_id = str(uuid.uuid4())
+    messages = [
+        message("human", question, example=False),
+        message(
+            "ai",
+            "",
+            tool_calls=[{"name": "retriever", "args": {"query": question}, "id": tool_call_id, "type": "tool_call"}],
+            invalid_tool_calls=[],
+            usage_metadata=None,
+            example=False,
+        ),
+        message(
+            "tool",
+            json.dumps([{"id": None, "metadata": doc["metadata"], "page_content": doc["page_content"], "type": "Document"} for doc in docs]),
+            tool_call_id=tool_call_id,
+            artifact=None,
+            status="success",
+        ),
+        message("ai", answer, tool_calls=[], invalid_tool_calls=[], usage_metadata=None, example=False),
+    ]
+    return json.dumps(
+        {
+            "object": "chat.completion",
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": json.dumps(messages)}, "finish_reason": "stop"}
+            ],
+        }
+    ).encode()
+
+
+def structured_payload(answer: str, docs: list[dict]) -> bytes:
+    return json.dumps(
+        {
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "custom_outputs": {
+                "sources": [{"query": doc["page_content"], "path": doc["metadata"]["path"]} for doc in docs]
+            },
+        }
+    ).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=3)
+    parser.add_argument("--chunk-words", type=int, default=150, help="words in each retrieved chunk")
+    parser.add_argument("--answer-words", type=int, default=200)
+    parser.add_argument("--number", type=int, default=2000, help="parses per measurement")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    question = "How do I create a Delta Live Tables pipeline?"
+    answer = " ".join(["pipeline"] * args.answer_words)
+    docs = [
+        {
+            "page_content": " ".join(["delta"] * args.chunk_words),
+            "metadata": {"path": f"/Volumes/main/chatten/main/raw_docs/manual_{i:03d}.pdf"},
+        }
+        for i in range(args.sources)
+    ]
+
+    payloads = {
+        "legacy": legacy_payload(question, answer, docs),
+        "structured": structured_payload(answer, docs),
+    }
+
+    parsed = {name: ChatResponse.from_json(payload) for name, payload in payloads.items()}
+    assert parsed["legacy"] == parsed["structured"], "both formats must parse to the same response"
+
+    for name, payload in payloads.items():
+        timings = timeit.repeat(
+            lambda: ChatResponse.from_json(payload), number=args.number, repeat=args.repeat
+        )
+        per_parse = min(timings) / args.number
+        print(f"{name:>10}: {len(payload):>7} bytes, {per_parse * 1e6:8.1f} us per parse")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Startup-time benchmark of the app.
+
+Each run starts a fresh interpreter and measures:
+- the time to import chatten_app.app,
+- the time until the first request to the liveness probe is answered (including the lifespan startup),
+- the time until the UI index page is served for the first time.
+
+Usage:
+
+    python scripts/bench_startup.py --runs 5
+    python scripts/bench_startup.py --importtime  # show the slowest imports
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import chatten_app.app as module
+imported = time.perf_counter()
+
+from starlette.testclient import TestClient
+with TestClient(module.app) as client:
+    client.get("/api/health/live").raise_for_status()
+    live = time.perf_counter()
+    client.get("/")
+    ui = time.perf_counter()
+
+print(json.dumps({
+    "import": imported - started,
+    "first_request": live - started,
+    "first_ui_request": ui - started,
+}))
+"""
+
+
+def measure(runs: int) -> None:
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for metric in results[0]:
+        values = [result[metric] for result in results]
+        print(
+            f"{metric:>18}: median {statistics.median(values) * 1000:8.1f} ms, "
+            f"min {min(values) * 1000:8.1f} ms, max {max(values) * 1000:8.1f} ms"
+        )
+
+
+def show_importtime(top: int) -> None:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import chatten_app.app"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        timings.append((int(cumulative), module.strip()))
+
+    for cumulative, module in sorted(timings, reverse=True)[:top]:
+        print(f"{cumulative / 1000:8.1f} ms  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.importtime:
+        show_importtime(args.top)
+    else:
+        measure(args.runs)
+
+
+if __name__ == "__main__":
+    main()
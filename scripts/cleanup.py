@@ -1,27 +1,225 @@
+"""Tears down all the chatten artifacts derived from the config.
+
+Artifacts are deleted in phases, following their dependencies:
+
+1. the agent serving endpoint and the vector search index (they use the model and the docs table)
+2. the registered model versions
+3. the registered model
+4. the docs table, the Auto Loader checkpoints and the files in the Volume
+   (raw docs, local index, app access log, pipeline state)
+5. the emptied Volume directories
+
+Within a phase, the artifacts are deleted concurrently. Use the dry run to list what would be deleted:
+
+    python scripts/cleanup.py --dry_run=true
+    python scripts/cleanup.py --max_workers=32
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import PosixPath
+from typing import Callable
+
 from chatten.config import Config
 from databricks.sdk import WorkspaceClient
+from databricks.sdk.errors import NotFound
 from loguru import logger
 
 
+class CleanupConfig(Config):
+    # only list the artifacts that would be deleted
+    dry_run: bool = False
+    # concurrent deletions within a phase
+    max_workers: int = 16
+
+
+@dataclass
+class Artifact:
+    kind: str
+    name: str
+    delete: Callable[[], None]
+
+
+class Cleanup:
+    def __init__(self, config: CleanupConfig, client: WorkspaceClient):
+        self.config = config
+        self.client = client
+        self.pool = ThreadPoolExecutor(max_workers=config.max_workers)
+
+    def _exists(self, get: Callable[[], object]) -> bool:
+        try:
+            get()
+            return True
+        except NotFound:
+            return False
+
+    def _walk(self, root: PosixPath) -> tuple[list[str], list[str]]:
+        """Files and directories under the Volume path, directories listed deepest first."""
+        files, directories = [], []
+        pending = [root.as_posix()]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = list(self.client.files.list_directory_contents(directory))
+            except NotFound:
+                continue
+            directories.append(directory)
+            for entry in entries:
+                if entry.is_directory:
+                    pending.append(entry.path.rstrip("/"))
+                else:
+                    files.append(entry.path)
+        directories.sort(key=lambda path: path.count("/"), reverse=True)
+        return files, directories
+
+    @property
+    def state_files(self) -> list[PosixPath]:
+        """Files written by the app and the pipeline next to the data: the access log and the pipeline state.
+        A leftover pipeline state would make the next pipeline run skip the stages and not redeploy anything.
+        """
+        return [self.config.full_access_log_path, self.config.full_pipeline_state_path]
+
+    @property
+    def volume_roots(self) -> list[PosixPath]:
+        roots = [
+            self.config.volume_path / self.config.raw_docs_checkpoint_location,
+            self.config.full_raw_docs_path,
+            self.config.full_local_index_path,
+        ]
+        # the directories of the state files are removed too, unless it's the Volume itself
+        roots.extend(
+            path.parent
+            for path in self.state_files
+            if path.parent != self.config.volume_path and path.parent not in roots
+        )
+        return roots
+
+    def serving(self) -> list[Artifact]:
+        artifacts = []
+        endpoint = self.config.agent_serving_endpoint_name
+        if self._exists(lambda: self.client.serving_endpoints.get(endpoint)):
+            artifacts.append(
+                Artifact("serving endpoint", endpoint, lambda: self.client.serving_endpoints.delete(endpoint))
+            )
+
+        index = self.config.vsi_with_catalog
+        if self._exists(lambda: self.client.vector_search_indexes.get_index(index)):
+            artifacts.append(
+                Artifact("vector search index", index, lambda: self.client.vector_search_indexes.delete_index(index))
+            )
+        return artifacts
+
+    def model_versions(self) -> list[Artifact]:
+        model = self.config.agent_serving_endpoint_with_catalog
+        try:
+            versions = [version.version for version in self.client.model_versions.list(model)]
+        except NotFound:
+            return []
+        return [
+            Artifact(
+                "model version",
+                f"{model}/{version}",
+                lambda version=version: self.client.model_versions.delete(model, version),
+            )
+            for version in versions
+        ]
+
+    def registered_model(self) -> list[Artifact]:
+        model = self.config.agent_serving_endpoint_with_catalog
+        if not self._exists(lambda: self.client.registered_models.get(model)):
+            return []
+        return [Artifact("registered model", model, lambda: self.client.registered_models.delete(model))]
+
+    def data(self) -> list[Artifact]:
+        artifacts = []
+        table = self.config.docs_with_catalog
+        if self._exists(lambda: self.client.tables.get(table)):
+            artifacts.append(Artifact("table", table, lambda: self.client.tables.delete(table)))
+
+        # the volume trees are listed concurrently, they can be large
+        files = []
+        for root_files, _ in self.pool.map(self._walk, self.volume_roots):
+            files.extend(root_files)
+
+        for state_file in self.state_files:
+            path = state_file.as_posix()
+            if path not in files and self._exists(lambda: self.client.files.get_metadata(path)):
+                files.append(path)
+
+        artifacts.extend(
+            Artifact("volume file", path, lambda path=path: self.client.files.delete(path)) for path in files
+        )
+        return artifacts
+
+    def directories(self) -> list[Artifact]:
+        def delete_tree(directories: list[str]):
+            # directories must be empty to be deleted, so the nested ones go first
+            for directory in directories:
+                self.client.files.delete_directory(directory)
+
+        return [
+            Artifact("volume directory", root.as_posix(), lambda directories=directories: delete_tree(directories))
+            for root, (_, directories) in zip(self.volume_roots, self.pool.map(self._walk, self.volume_roots))
+            if directories
+        ]
+
+    def _delete(self, artifact: Artifact) -> bool:
+        try:
+            artifact.delete()
+            logger.info(f"Deleted {artifact.kind}: {artifact.name}")
+            return True
+        except NotFound:
+            logger.info(f"Already deleted {artifact.kind}: {artifact.name}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting {artifact.kind} {artifact.name}: {e}")
+            return False
+
+    def run(self) -> bool:
+        phases = [
+            ("serving", self.serving),
+            ("model versions", self.model_versions),
+            ("registered model", self.registered_model),
+            ("data", self.data),
+            ("directories", self.directories),
+        ]
+
+        timings, all_deleted = [], True
+        for phase, enumerate_artifacts in phases:
+            started = time.perf_counter()
+            artifacts = enumerate_artifacts()
+
+            if self.config.dry_run:
+                for artifact in artifacts:
+                    logger.info(f"[dry run] would delete {artifact.kind}: {artifact.name}")
+                deleted = len(artifacts)
+            else:
+                results = list(self.pool.map(self._delete, artifacts))
+                deleted = sum(results)
+                all_deleted = all_deleted and all(results)
+
+            timings.append((phase, len(artifacts), deleted, time.perf_counter() - started))
+
+        logger.info("Cleanup summary:")
+        for phase, found, deleted, seconds in timings:
+            logger.info(f"{phase:>18}: {deleted}/{found} artifacts in {seconds:.1f}s")
+        return all_deleted
+
+
 def main():
-    config = Config()
+    config = CleanupConfig()
 
     logger.warning("Cleaning up the chatten artifacts, with config:")
     logger.warning(config.model_dump_json(indent=4))
 
     client = WorkspaceClient(profile=config.profile)
-
-    logger.info(f"Deleting the docs table: {config.docs_with_catalog}")
-    try:
-        client.tables.delete(config.docs_with_catalog)
-    except Exception as e:
-        logger.error(f"Error deleting the docs table: {e}")
-
-    logger.info(f"Deleting the vector search index: {config.vsi_with_catalog}")
+    cleanup = Cleanup(config, client)
     try:
-        client.vector_search_indexes.delete_index(config.vsi_with_catalog)
-    except Exception as e:
-        logger.error(f"Error deleting the vector search index: {e}")
+        if not cleanup.run():
+            raise SystemExit(1)
+    finally:
+        cleanup.pool.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+"""First paint of the chat UI in a headless browser, with a cold cache on every run.
+
+Reports the first contentful paint, the load event and the time until the Tailwind styles are applied
+to the chat component (an element with the `flex` utility class is laid out as flex). With the Tailwind CDN
+the styles only apply once the browser JIT compiled them, with the build-time stylesheet they come with the CSS.
+Run it against the app built before and after the change to compare, e.g.:
+
+    python scripts/first_paint.py --url http://localhost:8000 --runs 20 --cpu-throttling 4
+
+Needs Playwright with Chromium, which are not part of the project dependencies:
+
+    pip install playwright && playwright install chromium
+"""
+
+import argparse
+import statistics
+
+from playwright.sync_api import sync_playwright
+
+PAINT_TIMINGS = """() => {
+    const paint = performance.getEntriesByName("first-contentful-paint")[0];
+    const navigation = performance.getEntriesByType("navigation")[0];
+    return {fcp: paint ? paint.startTime : null, load: navigation.loadEventEnd};
+}"""
+
+STYLED = """() => {
+    const element = document.querySelector("#chatten .flex");
+    return element !== null && getComputedStyle(element).display === "flex";
+}"""
+
+
+def measure(url: str, runs: int, cpu_throttling: float) -> dict[str, list[float]]:
+    timings: dict[str, list[float]] = {"fcp": [], "load": [], "styled": []}
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        for _ in range(runs):
+            # a new context per run, so nothing is served from the browser cache
+            context = browser.new_context()
+            page = context.new_page()
+            if cpu_throttling > 1:
+                cdp = context.new_cdp_session(page)
+                cdp.send("Emulation.setCPUThrottlingRate", {"rate": cpu_throttling})
+
+            page.goto(url, wait_until="commit")
+            page.wait_for_function(STYLED, polling="raf", timeout=60_000)
+            styled = page.evaluate("performance.now()")
+            page.wait_for_load_state("load")
+
+            paint = page.evaluate(PAINT_TIMINGS)
+            timings["styled"].append(styled)
+            timings["load"].append(paint["load"])
+            if paint["fcp"] is not None:
+                timings["fcp"].append(paint["fcp"])
+            context.close()
+        browser.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--cpu-throttling", type=float, default=1, help="CPU slowdown factor, e.g. 4 for a slow laptop")
+    args = parser.parse_args()
+
+    timings = measure(args.url, args.runs, args.cpu_throttling)
+    print(f"{'metric':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for metric, values in timings.items():
+        if not values:
+            continue
+        p95 = statistics.quantiles(values, n=100)[94] if len(values) > 1 else values[0]
+        print(f"{metric:>8} {statistics.median(values):>9.1f} {p95:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Load test of the app serving path: /chat, /files and /files/relevant_page.
+
+Virtual users send a mix of requests for a fixed duration. File requests use the sources
+returned by the earlier chat answers, like the UI does. At the end, the script reports
+per endpoint the latency percentiles, throughput and status codes, plus the app memory
+(sampled from /api/metrics).
+
+By default the app runs in-process with the fake workspace backend (synthetic PDFs and a
+fake agent endpoint), so no Databricks workspace is needed. Tune the fakes with the
+CHATTEN_FAKE_* environment variables, e.g.:
+
+    CHATTEN_FAKE_QUERY_LATENCY_SECONDS=0.5 CHATTEN_FAKE_ERROR_RATE=0.05 \\
+        python scripts/loadtest.py --users 50 --duration 60 --mix chat=1,files=1,relevant_page=2
+
+The same traffic can be sent to a running app instead:
+
+    python scripts/loadtest.py --url http://localhost:8000 --users 20 --duration 60
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import AsyncExitStack
+
+import httpx
+
+RSS_PATTERN = re.compile(r"^process_resident_memory_bytes (\S+)$", re.MULTILINE)
+FILE_CACHE_PATTERN = re.compile(r'^chatten_cache_bytes\{cache="files"\} (\S+)$', re.MULTILINE)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.rss: list[float] = []
+        self.file_cache: list[float] = []
+
+    def record(self, endpoint: str, latency: float, status: int | str) -> None:
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status] += 1
+
+    def report(self, elapsed: float) -> None:
+        print(f"{'endpoint':>14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+        for endpoint, latencies in sorted(self.latencies.items()):
+            if len(latencies) > 1:
+                p = statistics.quantiles(latencies, n=100)
+                p50, p95, p99 = p[49], p[94], p[98]
+            else:
+                p50 = p95 = p99 = latencies[0]
+            statuses = ", ".join(f"{status}: {count}" for status, count in self.statuses[endpoint].most_common())
+            print(
+                f"{endpoint:>14} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} "
+                f"{p50 * 1000:>9.1f} {p95 * 1000:>9.1f} {p99 * 1000:>9.1f}  {statuses}"
+            )
+
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        print(f"\nTotal: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+        if self.rss:
+            print(f"RSS: peak {max(self.rss) / 2**20:.1f} MiB, final {self.rss[-1] / 2**20:.1f} MiB")
+        if self.file_cache:
+            print(f"File cache: peak {max(self.file_cache) / 2**20:.1f} MiB")
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        endpoint, _, weight = item.partition("=")
+        if endpoint not in ("chat", "files", "relevant_page"):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in the mix: {endpoint}")
+        mix[endpoint] = float(weight or 1)
+    return mix
+
+
+async def timed(stats: Stats, endpoint: str, request) -> httpx.Response | None:
+    started = time.perf_counter()
+    try:
+        response = await request
+        status = response.status_code
+    except httpx.HTTPError as e:
+        response, status = None, type(e).__name__
+    stats.record(endpoint, time.perf_counter() - started, status)
+    return response
+
+
+async def user(
+    client: httpx.AsyncClient,
+    stats: Stats,
+    mix: dict[str, float],
+    questions: list[str],
+    sources: list[tuple[str, str]],
+    deadline: float,
+) -> None:
+    endpoints, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        endpoint = random.choices(endpoints, weights)[0]
+        if endpoint != "chat" and not sources:
+            endpoint = "chat"  # nothing to open yet
+
+        if endpoint == "chat":
+            response = await timed(
+                stats, endpoint, client.post("/api/chat", json={"message": random.choice(questions)})
+            )
+            if response is not None and response.status_code == 200:
+                for meta in response.json()["metadata"]:
+                    sources.append((meta["file_name"], meta["content"]))
+        elif endpoint == "files":
+            file_name, _ = random.choice(sources)
+            await timed(stats, endpoint, client.get("/api/files", params={"file_name": file_name}))
+        else:
+            file_name, query = random.choice(sources)
+            await timed(
+                stats,
+                endpoint,
+                client.post("/api/files/relevant_page", json={"file_name": file_name, "query": query}),
+            )
+
+        # in-process, a request rejected right away completes without suspending,
+        # so the user yields to let the admitted requests and the other users progress
+        await asyncio.sleep(0)
+
+
+async def sample_metrics(client: httpx.AsyncClient, stats: Stats, interval: float) -> None:
+    while True:
+        try:
+            text = (await client.get("/api/metrics")).text
+            if match := RSS_PATTERN.search(text):
+                stats.rss.append(float(match.group(1)))
+            if match := FILE_CACHE_PATTERN.search(text):
+                stats.file_cache.append(float(match.group(1)))
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def run(args: argparse.Namespace) -> None:
+    async with AsyncExitStack() as stack:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        else:
+            os.environ.setdefault("CHATTEN_WORKSPACE_BACKEND", "fake")
+            os.environ.setdefault("CHATTEN_CATALOG", "loadtest")
+            sys.argv = sys.argv[:1]  # the app config parses the command line too
+
+            from chatten_app.app import app
+
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout
+            )
+        await stack.enter_async_context(client)
+
+        # wait for the background initialization, so it's not part of the measurements
+        while (readiness := await client.get("/api/health/ready")).status_code != 200:
+            if error := readiness.json()["startup"]["error"]:
+                raise SystemExit(f"App failed to start: {error}")
+            await asyncio.sleep(0.5)
+
+        stats = Stats()
+        questions = [f"question {i} about the docs" for i in range(args.questions)]
+        sources: list[tuple[str, str]] = []
+        sampler = asyncio.create_task(sample_metrics(client, stats, args.metrics_interval))
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(user(client, stats, args.mix, questions, sources, deadline) for _ in range(args.users))
+        )
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+
+    stats.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL of a running app, the app is started in-process if not set")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("chat=1,files=1,relevant_page=2"))
+    parser.add_argument("--questions", type=int, default=100, help="amount of distinct chat questions")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--metrics-interval", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from pathlib import Path, PosixPath
+from typing import Literal
 from loguru import logger
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -37,21 +38,104 @@ class Config(BaseSettings):
     # checkpoint locations in the volume
     raw_docs_checkpoint_location: PosixPath = PosixPath("checkpoints/raw")
 
+    # fingerprints and timings of the pipeline stages, in the volume (see chatten_rag.pipeline)
+    pipeline_state_path: PosixPath = PosixPath("pipeline/state.json")
+
     # table names
     docs_table: str = "docs"
 
     # vector search index name
     vsi: str = "vsi"
 
+    # embedding model endpoint
+    embeddings_endpoint: str = "databricks-gte-large-en"
+
+    # retriever of the agent: Databricks Vector Search, or the local index built from the docs table
+    retriever: Literal["vector_search", "local"] = "vector_search"
+    local_index_path: PosixPath = PosixPath("local_index")  # in the volume
+    # amount of IVF lists of the local index, 0 disables the partitioning (every query scans the whole corpus)
+    local_index_ivf_lists: int = 0
+    local_index_n_probe: int = 8  # IVF lists scanned per query
+
     # agent serving endpoint
     agent_serving_endpoint: str = "chatten_agent"
 
     # chat endpoint, to be used in the agent
     chat_endpoint: str = "databricks-meta-llama-3-3-70b-instruct"
 
-    # amout of files preloaded in the file cache when app starts
+    # "fake" replaces the serving endpoint and the Files API with local stand-ins, for offline load testing
+    workspace_backend: Literal["databricks", "fake"] = "databricks"
+    fake_query_latency_seconds: float = 1.0
+    fake_download_latency_seconds: float = 0.1
+    fake_error_rate: float = 0.0  # share of the agent calls rejected with 429
+    fake_num_files: int = 20
+    fake_pages_per_file: int = 30
+    fake_words_per_page: int = 300
+    fake_file_padding_bytes: int = 0  # extra payload per file, e.g. to mimic the embedded images
+    fake_sources_per_answer: int = 3
+
+    # serve the Dash static assets via ASGI instead of the WSGI bridge
+    serve_static_natively: bool = True
+
+    # file cache of the app, sized by the memory footprint of the files (raw bytes and extracted text)
+    file_cache_max_bytes: int = 1024 * 1024 * 1024
+    file_cache_ttl_in_seconds: int = 3600
+
+    # admission control of the /chat requests to the agent endpoint
+    chat_max_concurrency: int = 8
+    chat_max_queue: int = 32
+    chat_queue_timeout_seconds: float = 15
+    chat_retry_after_seconds: int = 5
+    # deadline of the agent endpoint call, including the retries on 429 and 503
+    chat_deadline_seconds: float = 60
+    upstream_max_attempts: int = 4
+
+    # single-page PDF slices served to the UI instead of the whole files
+    slice_window: int = 1  # pages before and after the requested one
+    max_slice_window: int = 10
+    slice_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # compute the relevant pages of the sources during /chat and return them with the answer
+    eager_relevant_pages: bool = False
+
+    # shared cache backend, used by all the app workers on the host behind their in-memory caches
+    # "memory" disables the shared tier, "sqlite" stores the caches in a local SQLite database in cache_dir
+    cache_backend: Literal["memory", "sqlite"] = "memory"
+    cache_dir: PosixPath = PosixPath("/tmp/chatten_cache")
+    shared_file_cache_max_bytes: int = 4 * 1024 * 1024 * 1024
+    shared_responses_cache_max_bytes: int = 64 * 1024 * 1024
+    # chat sessions are kept in the shared backend too, a session can be served by any worker
+    shared_conversations_max_bytes: int = 64 * 1024 * 1024
+
+    # amout of files preloaded in the file cache when app starts, used if there is no access history yet
     max_files_to_preload: int = 10
 
+    # access log of the files, used to pick the files preloaded on startup
+    access_log_path: PosixPath = PosixPath("app/access_log.json")
+    access_log_half_life_hours: float = 72
+    access_log_flush_seconds: int = 300
+
+    # startup warmup of the file cache
+    warmup_memory_budget_bytes: int = 512 * 1024 * 1024
+    warmup_min_interval_seconds: float = 0.5
+
+    # chat history sent to the agent, older turns are summarized to fit into the budget
+    history_token_budget: int = 2000
+    history_summary_token_budget: int = 400
+
+    # server-side chat sessions
+    max_sessions: int = 1000
+    session_ttl_in_seconds: int = 3600
+
+    @property
+    def upstream_retry_timeout_seconds(self) -> int:
+        """Retry budget of the Databricks SDK for each attempt of the agent endpoint call.
+        The SDK retries 429 and 503 itself (up to 5 minutes by default), so its budget is a share
+        of the deadline. One more share is left for the backoff of the app between the attempts,
+        and for the last sleep of the SDK, which can end past its budget.
+        """
+        return max(1, int(self.chat_deadline_seconds / (self.upstream_max_attempts + 1)))
+
     @property
     def volume_path(self) -> PosixPath:
         # note the /Volumes prefix, leading slash is important!
@@ -61,6 +145,18 @@ class Config(BaseSettings):
     def full_raw_docs_path(self) -> PosixPath:
         return self.volume_path / self.docs_path
 
+    @property
+    def full_local_index_path(self) -> PosixPath:
+        return self.volume_path / self.local_index_path
+
+    @property
+    def full_access_log_path(self) -> PosixPath:
+        return self.volume_path / self.access_log_path
+
+    @property
+    def full_pipeline_state_path(self) -> PosixPath:
+        return self.volume_path / self.pipeline_state_path
+
     @property
     def full_raw_docs_checkpoint_location(self) -> str:
         return (
@@ -86,6 +182,10 @@ class Config(BaseSettings):
             "chat_endpoint": self.chat_endpoint,
             "vsi": self.vsi_with_catalog,
             "PROMPT": self.PROMPT,
+            "retriever": self.retriever,
+            "embeddings_endpoint": self.embeddings_endpoint,
+            "local_index_path": self.full_local_index_path.as_posix(),
+            "local_index_n_probe": self.local_index_n_probe,
         }
 
     @property